@@ -0,0 +1,743 @@
+import os
+import logging
+import functools
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple, List, Dict, Callable
+
+import numpy as np
+
+try:
+    import numba
+    from numba import cuda
+except ImportError:  # numba is optional, fall back to plain NumPy without it
+    numba = None
+    cuda = None
+
+log = logging.getLogger('force_layout')
+
+# Positions are only displayed to the nearest pixel, so single precision is plenty
+# and halves the memory traffic of the force kernels
+POSITION_DTYPE = np.float32
+# Strength of the repulsive force between every pair of nodes
+REPULSION_STRENGTH = 150.0
+# Nodes with both velocity components below this don't move
+VELOCITY_DEADBAND = 0.1
+# The layout is settled once no node moves further than this (half a pixel) in a step
+SETTLED_DISPLACEMENT = 0.5
+# Above this many nodes summing every pair gets too slow (and the N x N temporaries
+# of the vectorized version too large), so fall back to the Barnes-Hut approximation
+EXACT_REPULSION_MAX_NODES = 1000
+# Up to this many nodes (without numba) the repulsion is summed by code generated
+# for that exact number of nodes, since NumPy's per call overhead dominates
+UNROLLED_REPULSION_MAX_NODES = 32
+# From this many nodes the vectorized exact repulsion is split into blocks of rows,
+# summed in parallel on a thread pool (NumPy releases the GIL for the heavy lifting)
+PARALLEL_REPULSION_MIN_NODES = 256
+# Below this many nodes the numba repulsion computes each pair once for both nodes on one
+# thread, rather than every pair twice across threads, as starting the threads costs more
+SYMMETRIC_REPULSION_MAX_NODES = 256
+REPULSION_THREADS = os.cpu_count() or 1
+# Below this many nodes copying to and from the GPU costs more than it saves
+CUDA_MIN_NODES = 2048
+# Threads per block, and positions per shared memory tile, of the CUDA kernel
+CUDA_BLOCK_SIZE = 128
+# Barnes-Hut opening angle, cells with width/distance below this are approximated
+BARNES_HUT_THETA = 0.9
+# Stop subdividing past this depth (guards against coincident nodes recursing forever)
+QUADTREE_MAX_DEPTH = 16
+# Leaves of the (pure Python) quadtree hold up to this many points. Summing a few points
+# exactly is cheaper than the interpreter overhead of building and walking more cells
+QUADTREE_LEAF_SIZE = 8
+
+
+class QuadTreeCell:
+    def __init__(self, left: float, top: float, width: float):
+        """
+        A square region of the quadtree, aggregating all the points inside it
+        :param left: Left edge of the cell
+        :param top: Top edge of the cell
+        :param width: Width (and height) of the cell
+        """
+        self.left = left
+        self.top = top
+        self.width = width
+        self.com_x = 0.0
+        self.com_y = 0.0
+        self.count = 0
+        # Leaves keep their points so they can be summed exactly, internal cells keep children
+        self.points: List[Tuple[float, float]] = []
+        self.children: Optional[List[QuadTreeCell]] = None
+
+    def contains(self, x: float, y: float) -> bool:
+        """
+        Check if a point lies within this cell
+        :param x: X coordinate of the point
+        :param y: Y coordinate of the point
+        :return: True if the point is inside the cell, False otherwise
+        """
+        return self.left <= x <= self.left + self.width and self.top <= y <= self.top + self.width
+
+
+class QuadTree:
+    def __init__(self, xs: List[float], ys: List[float], theta: float = BARNES_HUT_THETA):
+        """
+        Barnes-Hut quadtree of node positions, used to approximate the repulsive
+        force on a node in O(log N) instead of summing over every other node
+        :param xs: X coordinates of all the nodes
+        :param ys: Y coordinates of all the nodes
+        :param theta: Opening angle, larger is faster but less accurate
+        """
+        self.theta = theta
+        if xs:
+            left, top = min(xs), min(ys)
+            width = max(max(xs) - left, max(ys) - top)
+        else:
+            left = top = width = 0.0
+        self.root = QuadTreeCell(left, top, width)
+        self._build(self.root, list(zip(xs, ys)), 0)
+
+    def _build(self, cell: QuadTreeCell, points: List[Tuple[float, float]], depth: int):
+        """
+        Recursively subdivide a cell into 4 quadrants until each leaf holds at most QUADTREE_LEAF_SIZE points
+        :param cell: Cell to fill
+        :param points: Points that lie within the cell
+        :param depth: Current depth of the cell in the tree
+        """
+        cell.count = len(points)
+        if cell.count == 0:
+            return
+        cell.com_x = sum(p[0] for p in points) / cell.count
+        cell.com_y = sum(p[1] for p in points) / cell.count
+        if cell.count <= QUADTREE_LEAF_SIZE or depth >= QUADTREE_MAX_DEPTH:
+            cell.points = points
+            return
+
+        half_width = cell.width / 2
+        mid_x = cell.left + half_width
+        mid_y = cell.top + half_width
+        quadrant_points: List[List[Tuple[float, float]]] = [[], [], [], []]
+        for point in points:
+            quadrant_idx = (1 if point[0] > mid_x else 0) + (2 if point[1] > mid_y else 0)
+            quadrant_points[quadrant_idx].append(point)
+        cell.children = [
+            QuadTreeCell(cell.left, cell.top, half_width),
+            QuadTreeCell(mid_x, cell.top, half_width),
+            QuadTreeCell(cell.left, mid_y, half_width),
+            QuadTreeCell(mid_x, mid_y, half_width),
+        ]
+        for child, child_points in zip(cell.children, quadrant_points):
+            self._build(child, child_points, depth + 1)
+
+    def repulsion(self, x: float, y: float) -> Tuple[float, float]:
+        """
+        Sum the repulsive force acting on a point from every point in the tree
+        :param x: X coordinate of the point
+        :param y: Y coordinate of the point
+        :return: Tuple of the (x, y) velocity from repulsion
+        """
+        xvel = 0.0
+        yvel = 0.0
+        theta_squared = self.theta * self.theta
+        cells_to_visit = [self.root]
+        while cells_to_visit:
+            cell = cells_to_visit.pop()
+            if cell.count == 0:
+                continue
+            if cell.children is None:
+                # Leaf, sum exactly. The point itself has no distance so contributes nothing
+                for point_x, point_y in cell.points:
+                    dx = x - point_x
+                    dy = y - point_y
+                    l = 2.0 * (dx * dx + dy * dy)
+                    if l > 0:
+                        xvel += (dx * REPULSION_STRENGTH) / l
+                        yvel += (dy * REPULSION_STRENGTH) / l
+                continue
+
+            dx = x - cell.com_x
+            dy = y - cell.com_y
+            distance_squared = dx * dx + dy * dy
+            # Never approximate a cell containing the point, else it would repel itself
+            far_enough = cell.width * cell.width < theta_squared * distance_squared
+            if far_enough and not cell.contains(x, y):
+                # Treat the whole cell as a single pseudo-particle at its center of mass
+                l = 2.0 * distance_squared
+                xvel += (dx * REPULSION_STRENGTH * cell.count) / l
+                yvel += (dy * REPULSION_STRENGTH * cell.count) / l
+            else:
+                cells_to_visit.extend(cell.children)
+        return xvel, yvel
+
+
+def _jit(func):
+    """
+    Compile a force kernel with numba if it's available
+    :param func: Kernel to compile
+    :return: Compiled kernel, or the original function without numba
+    """
+    if numba is None:
+        return func
+    return numba.njit(parallel=True, fastmath=True, cache=True)(func)
+
+
+def _jit_serial(func):
+    """
+    Compile a serial force kernel with numba if it's available. Kernels without a prange loop
+    have nothing to parallelize, and compiling them with parallel=True only adds overhead
+    :param func: Kernel to compile
+    :return: Compiled kernel, or the original function without numba
+    """
+    if numba is None:
+        return func
+    return numba.njit(fastmath=True, cache=True)(func)
+
+
+_prange = numba.prange if numba is not None else range
+
+
+@_jit
+def _jit_repulsion_kernel(positions: np.ndarray, out_velocities: np.ndarray):
+    """
+    Sum the repulsive forces between every pair of nodes, one node per thread
+    :param positions: (N, 2) array of node positions
+    :param out_velocities: (N, 2) array to write the velocities from repulsion into
+    """
+    num_nodes = positions.shape[0]
+    for i in _prange(num_nodes):
+        x = positions[i, 0]
+        y = positions[i, 1]
+        xvel = 0.0
+        yvel = 0.0
+        for j in range(num_nodes):
+            dx = x - positions[j, 0]
+            dy = y - positions[j, 1]
+            l = 2.0 * (dx * dx + dy * dy)
+            if l > 0:
+                xvel += (dx * REPULSION_STRENGTH) / l
+                yvel += (dy * REPULSION_STRENGTH) / l
+        out_velocities[i, 0] = xvel
+        out_velocities[i, 1] = yvel
+
+
+@_jit_serial
+def _jit_symmetric_repulsion_kernel(positions: np.ndarray, out_velocities: np.ndarray):
+    """
+    Sum the repulsive forces between every pair of nodes, calculating each pair once and
+    applying it to both nodes. Half the work of _jit_repulsion_kernel, but serial
+    :param positions: (N, 2) array of node positions
+    :param out_velocities: (N, 2) array to write the velocities from repulsion into
+    """
+    num_nodes = positions.shape[0]
+    out_velocities[:] = 0.0
+    for i in range(num_nodes):
+        x = positions[i, 0]
+        y = positions[i, 1]
+        xvel = 0.0
+        yvel = 0.0
+        for j in range(i + 1, num_nodes):
+            dx = x - positions[j, 0]
+            dy = y - positions[j, 1]
+            l = 2.0 * (dx * dx + dy * dy)
+            if l > 0:
+                pair_xvel = (dx * REPULSION_STRENGTH) / l
+                pair_yvel = (dy * REPULSION_STRENGTH) / l
+                xvel += pair_xvel
+                yvel += pair_yvel
+                # Equal and opposite push on the other node
+                out_velocities[j, 0] -= pair_xvel
+                out_velocities[j, 1] -= pair_yvel
+        out_velocities[i, 0] += xvel
+        out_velocities[i, 1] += yvel
+
+
+def jit_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces between every pair of nodes with the numba kernels.
+    Unlike the vectorized version this doesn't allocate any N x N temporaries
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    velocities = np.empty_like(positions)
+    if len(positions) < SYMMETRIC_REPULSION_MAX_NODES:
+        _jit_symmetric_repulsion_kernel(positions, velocities)
+    else:
+        _jit_repulsion_kernel(positions, velocities)
+    return velocities
+
+
+@_jit_serial
+def _jit_attraction_kernel(
+    positions: np.ndarray, edge_index: np.ndarray, weights: np.ndarray, out_velocities: np.ndarray
+):
+    """
+    Add the attractive forces of every edge onto both of its nodes. Edges share
+    nodes, so this runs serially to keep the accumulation race free
+    :param positions: (N, 2) array of node positions
+    :param edge_index: (E, 2) array of node indices that each edge connects
+    :param weights: (N,) array of how strongly each node resists being pulled
+    :param out_velocities: (N, 2) array to add the velocities from attraction onto
+    """
+    for k in range(edge_index.shape[0]):
+        src = edge_index[k, 0]
+        dst = edge_index[k, 1]
+        dx = positions[dst, 0] - positions[src, 0]
+        dy = positions[dst, 1] - positions[src, 1]
+        out_velocities[src, 0] += dx / weights[src]
+        out_velocities[src, 1] += dy / weights[src]
+        out_velocities[dst, 0] -= dx / weights[dst]
+        out_velocities[dst, 1] -= dy / weights[dst]
+
+
+@_jit_serial
+def _jit_integrate_kernel(
+    positions: np.ndarray,
+    velocities: np.ndarray,
+    alpha: float,
+    min_positions: np.ndarray,
+    max_positions: np.ndarray,
+):
+    """
+    Turn the summed velocities into the new positions in place, in one pass instead
+    of a NumPy pass (and temporary) for each of cooling, the deadband and clamping
+    :param positions: (N, 2) array of node positions
+    :param velocities: (N, 2) array of summed velocities, overwritten with the new positions
+    :param alpha: How hot the layout is, scales all the velocities down as it cools
+    :param min_positions: (N, 2) array of the lowest position each node can move to
+    :param max_positions: (N, 2) array of the highest position each node can move to
+    """
+    for i in range(positions.shape[0]):
+        xvel = velocities[i, 0] * alpha
+        yvel = velocities[i, 1] * alpha
+        if abs(xvel) < VELOCITY_DEADBAND and abs(yvel) < VELOCITY_DEADBAND:
+            xvel = 0.0
+            yvel = 0.0
+        velocities[i, 0] = min(max(positions[i, 0] + xvel, min_positions[i, 0]), max_positions[i, 0])
+        velocities[i, 1] = min(max(positions[i, 1] + yvel, min_positions[i, 1]), max_positions[i, 1])
+
+
+def _cuda_jit(func):
+    """
+    Compile a force kernel for the GPU with numba if it's available
+    :param func: Kernel to compile
+    :return: Compiled kernel, or the original function without numba
+    """
+    if cuda is None:
+        return func
+    return cuda.jit(func)
+
+
+@functools.lru_cache(maxsize=None)
+def cuda_is_available() -> bool:
+    """
+    Check (once) if there is a CUDA device to run the force kernels on
+    :return: True if a CUDA device can be used, False otherwise
+    """
+    available = cuda is not None and cuda.is_available()
+    log.info(f'CUDA force kernels {"enabled" if available else "disabled"}')
+    return available
+
+
+@_cuda_jit
+def _cuda_repulsion_kernel(positions: np.ndarray, out_velocities: np.ndarray):
+    """
+    Sum the repulsive forces between every pair of nodes, one node per GPU thread.
+    Each block loads the positions a tile at a time into shared memory, so each
+    position is only read from global memory once per block
+    :param positions: (N, 2) device array of node positions
+    :param out_velocities: (N, 2) device array to write the velocities from repulsion into
+    """
+    tile = cuda.shared.array(shape=(CUDA_BLOCK_SIZE, 2), dtype=numba.float32)
+    thread_idx = cuda.threadIdx.x
+    i = cuda.grid(1)
+    num_nodes = positions.shape[0]
+    x = 0.0
+    y = 0.0
+    if i < num_nodes:
+        x = positions[i, 0]
+        y = positions[i, 1]
+
+    xvel = 0.0
+    yvel = 0.0
+    for tile_start in range(0, num_nodes, CUDA_BLOCK_SIZE):
+        # Every thread in the block loads one position of the tile, even past the last node
+        j = tile_start + thread_idx
+        if j < num_nodes:
+            tile[thread_idx, 0] = positions[j, 0]
+            tile[thread_idx, 1] = positions[j, 1]
+        cuda.syncthreads()
+        for k in range(min(CUDA_BLOCK_SIZE, num_nodes - tile_start)):
+            dx = x - tile[k, 0]
+            dy = y - tile[k, 1]
+            l = 2.0 * (dx * dx + dy * dy)
+            if l > 0:
+                xvel += (dx * REPULSION_STRENGTH) / l
+                yvel += (dy * REPULSION_STRENGTH) / l
+        # Don't start overwriting the tile until every thread is done with it
+        cuda.syncthreads()
+
+    if i < num_nodes:
+        out_velocities[i, 0] = xvel
+        out_velocities[i, 1] = yvel
+
+
+def cuda_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces between every pair of nodes on the GPU
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    device_positions = cuda.to_device(np.ascontiguousarray(positions))
+    device_velocities = cuda.device_array_like(device_positions)
+    num_blocks = (len(positions) + CUDA_BLOCK_SIZE - 1) // CUDA_BLOCK_SIZE
+    _cuda_repulsion_kernel[num_blocks, CUDA_BLOCK_SIZE](device_positions, device_velocities)
+    return device_velocities.copy_to_host()
+
+
+@functools.lru_cache(maxsize=None)
+def make_unrolled_repulsion(num_nodes: int) -> Callable[[List[List[float]]], List[Tuple[float, float]]]:
+    """
+    Generate a repulsion function specialized for a fixed number of nodes, with
+    every pair of nodes unrolled. Each pair is only calculated once, the force
+    on the second node is just the opposite of the first
+    :param num_nodes: Number of nodes the function sums the repulsion for
+    :return: Function taking a list of [x, y] node positions, returning a list of (x, y) velocities
+    """
+    if num_nodes == 0:
+        return lambda positions: []
+    lines = ['def unrolled_repulsion(positions):']
+    lines.append('    ' + ', '.join(f'(x{i}, y{i})' for i in range(num_nodes)) + ', = positions')
+    for i in range(num_nodes):
+        lines.append(f'    vx{i} = vy{i} = 0.0')
+    for i, j in itertools.combinations(range(num_nodes), 2):
+        lines.append(f'    dx = x{i} - x{j}')
+        lines.append(f'    dy = y{i} - y{j}')
+        lines.append(f'    l = 2.0 * (dx * dx + dy * dy)')
+        lines.append(f'    if l > 0:')
+        lines.append(f'        fx = (dx * {REPULSION_STRENGTH!r}) / l')
+        lines.append(f'        fy = (dy * {REPULSION_STRENGTH!r}) / l')
+        lines.append(f'        vx{i} += fx')
+        lines.append(f'        vy{i} += fy')
+        lines.append(f'        vx{j} -= fx')
+        lines.append(f'        vy{j} -= fy')
+    lines.append('    return [' + ', '.join(f'(vx{i}, vy{i})' for i in range(num_nodes)) + ']')
+
+    log.debug(f'Generating unrolled repulsion for {num_nodes} nodes')
+    namespace: Dict[str, Callable] = {}
+    exec(compile('\n'.join(lines), f'<unrolled repulsion, {num_nodes} nodes>', 'exec'), namespace)
+    return namespace['unrolled_repulsion']
+
+
+def unrolled_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces between every pair of nodes with a function
+    generated for exactly this many nodes
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    repulsion_func = make_unrolled_repulsion(len(positions))
+    return np.array(repulsion_func(positions.tolist()), dtype=positions.dtype).reshape(-1, 2)
+
+
+# Each thread's scratch planes for the exact repulsion, kept between layout steps
+_repulsion_scratch = threading.local()
+
+
+def _repulsion_buffers(shape: Tuple[int, int], dtype: np.dtype) -> Tuple[np.ndarray, ...]:
+    """
+    Get this thread's scratch planes for the exact repulsion. They're only reallocated when
+    the graph (or the block of rows this thread gets) changes size, not every layout step
+    :param shape: (M, N) shape of the planes
+    :param dtype: Data type of the planes
+    :return: Tuple of (dx, dy, distance, scale, has distance mask) planes
+    """
+    buffers = getattr(_repulsion_scratch, 'buffers', None)
+    if buffers is None or buffers[0].shape != shape or buffers[0].dtype != dtype:
+        buffers = tuple(np.empty(shape, dtype=dtype) for _ in range(4)) + (np.empty(shape, dtype=bool),)
+        _repulsion_scratch.buffers = buffers
+    return buffers
+
+
+def _exact_repulsion_rows(positions: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces on some of the nodes from every node in one vectorized pass
+    :param positions: (N, 2) array of node positions
+    :param rows: (M, 2) array of the positions of the nodes to sum the forces on
+    :return: (M, 2) array of velocities from repulsion
+    """
+    # Separate (M, N) x and y planes instead of one interleaved (M, N, 2) array, so every
+    # step below streams through contiguous memory and can be done in place
+    dx, dy, l, scale, has_distance = _repulsion_buffers((len(rows), len(positions)), positions.dtype)
+    np.subtract(rows[:, 0, None], positions[None, :, 0], out=dx)
+    np.subtract(rows[:, 1, None], positions[None, :, 1], out=dy)
+    np.multiply(dx, dx, out=l)
+    np.multiply(dy, dy, out=scale)
+    l += scale
+    l *= 2.0
+    # Nodes have no distance to themselves (or to coincident nodes), those pairs don't push
+    np.greater(l, 0.0, out=has_distance)
+    scale.fill(0.0)
+    np.divide(REPULSION_STRENGTH, l, out=scale, where=has_distance)
+    dx *= scale
+    dy *= scale
+    return np.stack((dx.sum(axis=1), dy.sum(axis=1)), axis=1)
+
+
+@functools.lru_cache(maxsize=None)
+def _repulsion_thread_pool() -> ThreadPoolExecutor:
+    """
+    Create (once) the thread pool the exact repulsion is split across
+    :return: Thread pool with a thread per CPU
+    """
+    return ThreadPoolExecutor(max_workers=REPULSION_THREADS, thread_name_prefix='repulsion')
+
+
+def exact_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces between every pair of nodes, vectorized. Large graphs
+    are split into blocks of rows across a thread pool, which also bounds the size
+    of the N x N temporaries to a block at a time
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    if len(positions) < PARALLEL_REPULSION_MIN_NODES:
+        return _exact_repulsion_rows(positions, positions)
+    row_blocks = np.array_split(positions, REPULSION_THREADS)
+    block_velocities = _repulsion_thread_pool().map(functools.partial(_exact_repulsion_rows, positions), row_blocks)
+    return np.concatenate(list(block_velocities))
+
+
+@_jit
+def _jit_barnes_hut_kernel(positions: np.ndarray, theta: float, out_velocities: np.ndarray):
+    """
+    Approximate the repulsive forces on every node with a Barnes-Hut quadtree
+    built in flat arrays. The tree is built serially by inserting one node at a
+    time, then every node walks it in parallel. Leaves hold a linked list of
+    their nodes so they are always summed exactly, like QuadTree
+    :param positions: (N, 2) array of node positions
+    :param theta: Opening angle, larger is faster but less accurate
+    :param out_velocities: (N, 2) array to write the velocities from repulsion into
+    """
+    num_nodes = positions.shape[0]
+    if num_nodes == 0:
+        return
+    # Every insertion splits at most QUADTREE_MAX_DEPTH cells into 4. Arrays are
+    # zeroed so only the pages of cells actually used get touched. 0 is never a
+    # child (it's the root), so it marks leaves in child_start, and nodes are
+    # stored offset by 1 so 0 marks the end of a leaf's list
+    max_cells = 4 * QUADTREE_MAX_DEPTH * num_nodes + 1
+    cell_left = np.zeros(max_cells, dtype=np.float64)
+    cell_top = np.zeros(max_cells, dtype=np.float64)
+    cell_width = np.zeros(max_cells, dtype=np.float64)
+    cell_count = np.zeros(max_cells, dtype=np.int64)
+    cell_sum_x = np.zeros(max_cells, dtype=np.float64)
+    cell_sum_y = np.zeros(max_cells, dtype=np.float64)
+    child_start = np.zeros(max_cells, dtype=np.int64)
+    first_node = np.zeros(max_cells, dtype=np.int64)
+    next_node = np.zeros(num_nodes + 1, dtype=np.int64)
+
+    cell_left[0] = positions[:, 0].min()
+    cell_top[0] = positions[:, 1].min()
+    cell_width[0] = max(positions[:, 0].max() - cell_left[0], positions[:, 1].max() - cell_top[0])
+    num_cells = 1
+    for p in range(num_nodes):
+        x = positions[p, 0]
+        y = positions[p, 1]
+        cell = 0
+        depth = 0
+        while True:
+            cell_count[cell] += 1
+            cell_sum_x[cell] += x
+            cell_sum_y[cell] += y
+            half_width = cell_width[cell] / 2
+            if child_start[cell] != 0:
+                quadrant_idx = (1 if x > cell_left[cell] + half_width else 0) + (
+                    2 if y > cell_top[cell] + half_width else 0
+                )
+                cell = child_start[cell] + quadrant_idx
+                depth += 1
+                continue
+            if cell_count[cell] == 1 or depth >= QUADTREE_MAX_DEPTH:
+                next_node[p + 1] = first_node[cell]
+                first_node[cell] = p + 1
+                break
+
+            # Leaf already holding a single node, split it and push that node down a level
+            first_child = num_cells
+            num_cells += 4
+            child_start[cell] = first_child
+            for quadrant_idx in range(4):
+                cell_left[first_child + quadrant_idx] = cell_left[cell] + half_width * (quadrant_idx % 2)
+                cell_top[first_child + quadrant_idx] = cell_top[cell] + half_width * (quadrant_idx // 2)
+                cell_width[first_child + quadrant_idx] = half_width
+            q = first_node[cell] - 1
+            first_node[cell] = 0
+            qx = positions[q, 0]
+            qy = positions[q, 1]
+            q_cell = first_child + (1 if qx > cell_left[cell] + half_width else 0) + (
+                2 if qy > cell_top[cell] + half_width else 0
+            )
+            cell_count[q_cell] = 1
+            cell_sum_x[q_cell] = qx
+            cell_sum_y[q_cell] = qy
+            first_node[q_cell] = q + 1
+            # Go around again, inserting this node into the cell that was just split
+            cell_count[cell] -= 1
+            cell_sum_x[cell] -= x
+            cell_sum_y[cell] -= y
+
+    theta_squared = theta * theta
+    for i in _prange(num_nodes):
+        x = positions[i, 0]
+        y = positions[i, 1]
+        xvel = 0.0
+        yvel = 0.0
+        cells_to_visit = np.empty(4 * (QUADTREE_MAX_DEPTH + 1), dtype=np.int64)
+        cells_to_visit[0] = 0
+        num_to_visit = 1
+        while num_to_visit > 0:
+            num_to_visit -= 1
+            cell = cells_to_visit[num_to_visit]
+            if cell_count[cell] == 0:
+                continue
+            if child_start[cell] == 0:
+                # Leaf, sum exactly. The node itself has no distance so contributes nothing
+                node = first_node[cell]
+                while node != 0:
+                    dx = x - positions[node - 1, 0]
+                    dy = y - positions[node - 1, 1]
+                    l = 2.0 * (dx * dx + dy * dy)
+                    if l > 0:
+                        xvel += (dx * REPULSION_STRENGTH) / l
+                        yvel += (dy * REPULSION_STRENGTH) / l
+                    node = next_node[node]
+                continue
+
+            dx = x - cell_sum_x[cell] / cell_count[cell]
+            dy = y - cell_sum_y[cell] / cell_count[cell]
+            distance_squared = dx * dx + dy * dy
+            # Never approximate a cell containing the node, else it would repel itself
+            contains = (
+                cell_left[cell] <= x <= cell_left[cell] + cell_width[cell]
+                and cell_top[cell] <= y <= cell_top[cell] + cell_width[cell]
+            )
+            if not contains and cell_width[cell] * cell_width[cell] < theta_squared * distance_squared:
+                # Treat the whole cell as a single pseudo-particle at its center of mass
+                l = 2.0 * distance_squared
+                xvel += (dx * REPULSION_STRENGTH * cell_count[cell]) / l
+                yvel += (dy * REPULSION_STRENGTH * cell_count[cell]) / l
+            else:
+                for quadrant_idx in range(4):
+                    cells_to_visit[num_to_visit] = child_start[cell] + quadrant_idx
+                    num_to_visit += 1
+        out_velocities[i, 0] = xvel
+        out_velocities[i, 1] = yvel
+
+
+def jit_barnes_hut_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Approximate the repulsive forces on every node with the numba Barnes-Hut kernel
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    velocities = np.empty_like(positions)
+    _jit_barnes_hut_kernel(positions, BARNES_HUT_THETA, velocities)
+    return velocities
+
+
+def barnes_hut_repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Approximate the repulsive forces on every node with a Barnes-Hut quadtree
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    xs = positions[:, 0].tolist()
+    ys = positions[:, 1].tolist()
+    quadtree = QuadTree(xs, ys)
+    return np.array([quadtree.repulsion(x, y) for x, y in zip(xs, ys)], dtype=positions.dtype).reshape(-1, 2)
+
+
+def repulsion(positions: np.ndarray) -> np.ndarray:
+    """
+    Sum the repulsive forces on every node, picking the fastest method for the graph size
+    :param positions: (N, 2) array of node positions
+    :return: (N, 2) array of velocities from repulsion
+    """
+    if len(positions) >= CUDA_MIN_NODES and cuda_is_available():
+        return cuda_repulsion(positions)
+    if len(positions) > EXACT_REPULSION_MAX_NODES:
+        return jit_barnes_hut_repulsion(positions) if numba is not None else barnes_hut_repulsion(positions)
+    if numba is not None:
+        return jit_repulsion(positions)
+    if len(positions) <= UNROLLED_REPULSION_MAX_NODES:
+        return unrolled_repulsion(positions)
+    return exact_repulsion(positions)
+
+
+def attraction(
+    positions: np.ndarray, edge_index: np.ndarray, weights: np.ndarray, out: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """
+    Sum the attractive forces pulling each node towards the nodes it is connected to
+    :param positions: (N, 2) array of node positions
+    :param edge_index: (E, 2) array of node indices that each edge connects
+    :param weights: (N,) array of how strongly each node resists being pulled
+    :param out: Optional (N, 2) array of velocities to add the attraction onto, instead of a new array
+    :return: (N, 2) array of velocities from attraction (added onto out, if given)
+    """
+    velocities = np.zeros_like(positions) if out is None else out
+    if numba is not None:
+        _jit_attraction_kernel(positions, edge_index, weights, velocities)
+        return velocities
+    src = edge_index[:, 0]
+    dst = edge_index[:, 1]
+    edge_deltas = positions[dst] - positions[src]
+    # Edges pull on both of their nodes
+    np.add.at(velocities, src, edge_deltas / weights[src, None])
+    np.add.at(velocities, dst, -edge_deltas / weights[dst, None])
+    return velocities
+
+
+def layout_step(
+    positions: np.ndarray,
+    edge_index: np.ndarray,
+    weights: np.ndarray,
+    min_positions: np.ndarray,
+    max_positions: np.ndarray,
+    alpha: float = 1.0,
+) -> np.ndarray:
+    """
+    Advance the force directed layout one step
+    :param positions: (N, 2) array of node positions
+    :param edge_index: (E, 2) array of node indices that each edge connects
+    :param weights: (N,) array of how strongly each node resists being pulled
+    :param min_positions: (N, 2) array of the lowest position each node can move to
+    :param max_positions: (N, 2) array of the highest position each node can move to
+    :param alpha: How hot the layout is, scales all the velocities down as it cools
+    :return: (N, 2) array of the new node positions
+    """
+    # Sum up all forces pushing items away, and pulling connected items together.
+    # Everything after the repulsion is done in place in its (freshly allocated) result
+    velocities = repulsion(positions)
+    attraction(positions, edge_index, weights, out=velocities)
+    if numba is not None:
+        _jit_integrate_kernel(positions, velocities, alpha, min_positions, max_positions)
+        return velocities
+    velocities *= alpha
+    velocities[(np.abs(velocities) < VELOCITY_DEADBAND).all(axis=1)] = 0.0
+    velocities += positions
+    return np.clip(velocities, min_positions, max_positions, out=velocities)
+
+
+def max_displacement_squared(positions: np.ndarray, new_positions: np.ndarray) -> float:
+    """
+    Find how far the node that moved the most in a layout step moved
+    :param positions: (N, 2) array of node positions before the step
+    :param new_positions: (N, 2) array of node positions after the step
+    :return: The largest squared distance any node moved, 0 if there are no nodes
+    """
+    if len(positions) == 0:
+        return 0.0
+    displacements = new_positions - positions
+    return float(np.einsum('ij,ij->i', displacements, displacements).max())
@@ -1,37 +1,66 @@
-import weakref
 import math
+import contextlib
 import sys
+import time
 import signal
 import traceback
 import logging
 import random
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Any, Generator
+from typing import Dict, List, Optional, Tuple, Any, Callable, Generator, Set, FrozenSet, Iterator
 
 import networkx as nx
-from PySide6.QtCore import QLineF, QPointF, QRectF, Qt, qAbs, QTimer
-from PySide6.QtGui import QPainter, QPainterPath, QPen, QColor, QAction
+import numpy as np
+from PySide6.QtCore import QLineF, QRect, QRectF, Qt, QTimer, QObject, QThread, Signal, Slot
+from PySide6.QtGui import (
+    QPainter,
+    QPen,
+    QBrush,
+    QColor,
+    QAction,
+    QFont,
+    QFontMetrics,
+    QPixmap,
+    QPixmapCache,
+    QSurfaceFormat,
+)
+from PySide6.QtOpenGLWidgets import QOpenGLWidget
 from PySide6.QtWidgets import (
     QApplication,
     QMainWindow,
     QWidget,
     QGraphicsItem,
+    QGraphicsEllipseItem,
+    QGraphicsLineItem,
     QGraphicsScene,
     QGraphicsView,
-    QStyle,
     QHBoxLayout,
+    QLabel,
     QFileDialog,
     QStyleOptionGraphicsItem,
 )
 from pyqtgraph.parametertree import Parameter, ParameterTree, parameterTypes
 
 from simulation_model import SimObject, Train, Track, Junction, Simulation
+from force_layout import layout_step, max_displacement_squared, SETTLED_DISPLACEMENT, POSITION_DTYPE
 
 log = logging.getLogger('graphics_visualization')
 
+# Zoomed out past this level of detail, only the outline of the graph can be made out
+DETAIL_MIN_LEVEL_OF_DETAIL = 0.1
+# Zoomed out past this level of detail, text is too small (a few pixels) to read
+TEXT_MIN_LEVEL_OF_DETAIL = 0.5
+# Render the graph with OpenGL instead of the raster paint engine. Can be turned off
+# (before creating the GraphWidget) for systems without working OpenGL drivers
+USE_OPENGL_VIEWPORT = True
+# Multisampling used for antialiasing on the OpenGL viewport
+OPENGL_SAMPLES = 4
+
 
-class QtEdge(QGraphicsItem):
+class QtEdge(QGraphicsLineItem):
     item_type = QGraphicsItem.UserType + 2
+    # Pens don't change between paints, so share them instead of constructing them every paint
+    _LINE_PEN = QPen(Qt.black, 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
 
     def __init__(self, source_node: 'QtNode', dest_node: 'QtNode'):
         """
@@ -42,12 +71,16 @@ class QtEdge(QGraphicsItem):
         super().__init__()
 
         self.connecting_line = QLineF()
-        self.bounds = QRectF()
+        self.line_bounds = QRectF()
+        self.line_unit_normal: Tuple[float, float] = (0.0, 0.0)
+        # Let Qt draw the line itself, without calling back into Python every paint
+        self.setPen(self._LINE_PEN)
         self.setAcceptedMouseButtons(Qt.NoButton)
-        self.source: weakref.ReferenceType[QtNode] = weakref.ref(source_node)
-        self.dest: weakref.ReferenceType[QtNode] = weakref.ref(dest_node)
-        self.source().add_edge(self)
-        self.dest().add_edge(self)
+        # The scene owns both the nodes and edges, so plain references are safe
+        self.source: QtNode = source_node
+        self.dest: QtNode = dest_node
+        self.source.add_edge(self)
+        self.dest.add_edge(self)
         self.adjust()
         self.show_debug = False
 
@@ -56,49 +89,65 @@ class QtEdge(QGraphicsItem):
         Update our connecting line geometry to the current source and
         destination Node positions
         """
-        if not self.source() or not self.dest():
-            log.warning(f'No source ({self.source()}) or dest ({self.dest()}) node to adjust')
-            return
-
-        line = QLineF(self.mapFromItem(self.source(), 0, 0), self.mapFromItem(self.dest(), 0, 0))
-        length = line.length()
+        # Neither edges nor nodes have a parent or get moved/transformed themselves,
+        # so the node positions can be used directly instead of mapping them.
+        # Plain float math, instead of building a QPointF/QLineF for every step
+        x1, y1 = self.source.pos().toTuple()
+        x2, y2 = self.dest.pos().toTuple()
+        dx = x2 - x1
+        dy = y2 - y1
+        length = math.hypot(dx, dy)
 
         if length == 0.0:
             return
 
-        self.prepareGeometryChange()
-        source_offset = self.source().circle_radius / 2
-        dest_offset = self.dest().circle_radius / 2
-        source_point = line.p1() + QPointF((line.dx() * source_offset) / length, (line.dy() * source_offset) / length)
-        dest_point = line.p2() - QPointF((line.dx() * dest_offset) / length, (line.dy() * dest_offset) / length)
-        self.connecting_line = QLineF(source_point, dest_point)
+        source_scale = self.source.circle_radius / 2 / length
+        dest_scale = self.dest.circle_radius / 2 / length
+        source_x = x1 + dx * source_scale
+        source_y = y1 + dy * source_scale
+        dest_x = x2 - dx * dest_scale
+        dest_y = y2 - dy * dest_scale
+        self.connecting_line = QLineF(source_x, source_y, dest_x, dest_y)
+        # Geometry that only changes when the nodes move, so paint doesn't have to recalculate it
+        self.line_bounds = QRectF(self.connecting_line.p1(), self.connecting_line.p2()).normalized()
+        # Unit normal of the connecting line, which is reversed if the node circles overlap
+        connecting_length = math.hypot(dest_x - source_x, dest_y - source_y)
+        if connecting_length > 0.0:
+            self.line_unit_normal = (
+                (dest_y - source_y) / connecting_length,
+                (source_x - dest_x) / connecting_length,
+            )
+        # Only prepares a geometry change (and pads the bounds by the pen width) if the line changed
+        self.setLine(self.connecting_line)
+        # Nothing else needs repainting here. Trains on the line are moved to follow it (which repaints
+        # them) by update_geometry, and the fork lines of its nodes by whoever moved the nodes
 
-    def boundingRect(self) -> QRectF:
+    def update_geometry(self):
         """
-        Return this QGraphicsItems bounding rectangle
-        :return: Object bounding rectangle
+        Lay out whatever is drawn around the line. A plain edge only draws the line itself
         """
-        return self.bounds
 
-    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
+    def set_show_debug(self, show_debug: bool):
         """
-        Paint this QGraphicsItem
-        :param painter: QPainter instance for drawing
-        :param option: Styling options
-        :param widget: Optionally the widget that is being painted on
+        Show or hide the debug text of this edge
+        :param show_debug: True to show the debug text, False to hide it
         """
-        if not self.source() or not self.dest():
-            log.warning(f'No source ({self.source()}) or dest ({self.dest()}) node. Nothing to paint')
-            return
-
-        painter.setPen(QPen(Qt.black, 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-        painter.drawLine(self.connecting_line)
-        line_bounds = QRectF(self.connecting_line.p1(), self.connecting_line.p2()).normalized()
+        self.show_debug = show_debug
+        self.update()
 
-        self.bounds = line_bounds
+    def type(self) -> int:
+        """
+        Return this QGraphicsItems type, so it can be identified without isinstance
+        :return: Item type
+        """
+        return self.item_type
 
 
 class QtTrain(QGraphicsItem):
+    # Drawn centered on the origin, the item itself is moved and rotated to follow the track
+    _BODY_RECT = QRectF(-15, -5, 30, 10)
+    _FRONT_RECT = QRectF(-15, -5, 5, 10)
+
     def __init__(self, train_colour: Qt.GlobalColor, parent: QtEdge):
         """
         QGraphicsItem representing a Train. Must be a child of an Edge
@@ -107,7 +156,13 @@ class QtTrain(QGraphicsItem):
         """
         super().__init__(parent)
         self.train_colour: Qt.GlobalColor = train_colour
-        self.bounds = QRectF()
+        # Every train has its own colour, so keep its own pen and brush instead of converting the colour every paint
+        self._pen = QPen(train_colour)
+        self._brush = QBrush(train_colour)
+        self._debug_text = ''
+        self._text_bounds = QRect()
+        # Increase bounds a bit, else some minor artefact show
+        self.bounds = self._BODY_RECT.adjusted(-1, -1, 1, 1)
         self.show_debug = False
 
     def boundingRect(self) -> QRectF:
@@ -117,6 +172,56 @@ class QtTrain(QGraphicsItem):
         """
         return self.bounds
 
+    def update_geometry(self):
+        """
+        Move and rotate to the middle of the parent track, facing the junction the train is heading to
+        """
+        parent_item: QtTrack = self.parentItem()
+        train = parent_item.track.train
+        facing_sim_junction = train.facing_junction
+        if parent_item.source.junction == facing_sim_junction:
+            facing_qt_junction = parent_item.source
+        elif parent_item.dest.junction == facing_sim_junction:
+            facing_qt_junction = parent_item.dest
+        else:
+            raise IndexError(f'No facing junction for {train}')
+
+        # The track has no position or transform of its own, so junction positions are already in its coordinates
+        parent_center = parent_item.connecting_line.center()
+        center_x, center_y = parent_center.toTuple()
+        facing_x, facing_y = facing_qt_junction.pos().toTuple()
+        # Same as QLineF.angle(), counterclockwise with y pointing down, without building a line to get it
+        angle_to_facing_junction = math.degrees(math.atan2(center_y - facing_y, facing_x - center_x))
+        self.setPos(parent_center)
+        self.setRotation(180 - angle_to_facing_junction)
+
+        debug_text = f'Train{train.ident}'
+        if debug_text != self._debug_text:
+            self._debug_text = debug_text
+            self.update_bounds()
+
+    def update_bounds(self):
+        """
+        Fit the bounds to the train body, and the debug text if it's shown
+        """
+        bounds = self._BODY_RECT.adjusted(-1, -1, 1, 1)
+        if self.show_debug:
+            self._text_bounds = get_text_bounds(get_debug_font(6), self._debug_text)
+            self._text_bounds.moveTo(0, 0)
+            bounds = bounds.united(self._text_bounds)
+        if bounds != self.bounds:
+            self.prepareGeometryChange()
+            self.bounds = bounds
+        self.update()
+
+    def set_show_debug(self, show_debug: bool):
+        """
+        Show or hide the debug text of this train
+        :param show_debug: True to show the debug text, False to hide it
+        """
+        self.show_debug = show_debug
+        self.update_bounds()
+
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
         """
         Paint this QGraphicsItem
@@ -124,52 +229,16 @@ class QtTrain(QGraphicsItem):
         :param option: Styling options
         :param widget: Optionally the widget that is being painted on
         """
-        parent_item: QtTrack = self.parentItem()
-        parent_center = parent_item.connecting_line.center()
-        body_rect = QRectF(parent_center.x(), parent_center.y(), 30, 10)
-        body_rect.moveCenter(body_rect.topLeft())  # Center the rectangle on the line
-        front_rect = QRectF(body_rect.x(), body_rect.y(), 5, 10)
-
-        facing_sim_junction = parent_item.track.train.facing_junction
-        if parent_item.source().junction == facing_sim_junction:
-            facing_qt_junction = parent_item.source()
-        elif parent_item.dest().junction == facing_sim_junction:
-            facing_qt_junction = parent_item.dest()
-        else:
-            raise IndexError(f'No facing junction for {parent_item.track.train}')
-
-        # Rotate ourself about the center
-        # (can't just rotate the painting because the bounds will get screwed up)
-        self.resetTransform()
-        t = self.transform()
-        t.translate(body_rect.center().x(), body_rect.center().y())
-        # I hate rotation matrices, this took a lot of trial and error
-        line_to_facing_junction = QLineF(body_rect.center(), self.mapFromItem(facing_qt_junction, 0, 0))
-        t.rotate(-line_to_facing_junction.angle() + 180)
-        t.translate(-body_rect.center().x(), -body_rect.center().y())
-        self.setTransform(t)
-
-        painter.setPen(self.train_colour)
-        painter.drawRect(body_rect)
-        painter.setBrush(self.train_colour)
-        painter.drawRect(front_rect)
+        # The train is rotated to follow the track, so it needs antialiasing (unless it's moving anyway)
+        painter.setRenderHint(QPainter.Antialiasing, not self.parentItem().source.graph.skip_antialiasing)
+        painter.setPen(self._pen)
+        painter.drawRect(self._BODY_RECT)
+        painter.setBrush(self._brush)
+        painter.drawRect(self._FRONT_RECT)
 
         if self.show_debug:
-            font = painter.font()
-            text = f'Train{parent_item.track.train.ident}'
-            font.setPointSize(6)
-            painter.setFont(font)
-            text_bounds = painter.fontMetrics().boundingRect(text)
-            text_bounds.moveTo(parent_center.toPoint())
-            painter.drawText(text_bounds, 0, text)
-        else:
-            text_bounds = QRectF()
-
-        # Increase bounds a bit, else some minor artefact show
-        siz = body_rect.size()
-        siz *= 1.5
-        body_rect.setSize(siz)
-        self.bounds = body_rect.united(text_bounds).united(front_rect)
+            painter.setFont(get_debug_font(6))
+            painter.drawText(self._text_bounds, 0, self._debug_text)
 
 
 def random_qcolor_generator(seed: int = 0) -> Generator[QColor, None, None]:
@@ -194,15 +263,93 @@ def get_track_line_colour(track_line: Train) -> QColor:
     :param track_line: Train to determine the colour of
     :return: track_lines colour
     """
-    global track_line_colour_lookup
-    train_ident = track_line.ident
-    if train_ident not in track_line_colour_lookup:
-        track_line_colour_lookup[train_ident] = next(random_qcolor_generator)
-        log.debug(f'Created train colour {track_line_colour_lookup[train_ident]}')
-    return track_line_colour_lookup[train_ident]
+    # One lookup when the colour already exists, which is every time but the first
+    colour = track_line_colour_lookup.get(track_line.ident)
+    if colour is None:
+        colour = track_line_colour_lookup[track_line.ident] = next(random_qcolor_generator)
+        log.debug(f'Created train colour {colour}')
+    return colour
+
+
+track_line_pen_lookup: Dict[int, QPen] = {}
+
+
+def get_track_line_pen(track_line: Train) -> QPen:
+    """
+    Get the (shared) pen for drawing a Train's route, so one isn't constructed every paint
+    :param track_line: Train to get the route pen of
+    :return: track_lines route pen
+    """
+    pen = track_line_pen_lookup.get(track_line.ident)
+    if pen is None:
+        pen = track_line_pen_lookup[track_line.ident] = QPen(
+            get_track_line_colour(track_line), QtTrack.ROUTE_LINE_WIDTH, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin
+        )
+    return pen
+
+
+colour_pen_lookup: Dict[Qt.GlobalColor, QPen] = {}
+colour_brush_lookup: Dict[Qt.GlobalColor, QBrush] = {}
+
+
+def get_colour_pen(colour: Qt.GlobalColor) -> QPen:
+    """
+    Get the (shared) pen of a colour, so one isn't constructed every paint
+    :param colour: Colour of the pen
+    :return: Pen of colour
+    """
+    if colour not in colour_pen_lookup:
+        colour_pen_lookup[colour] = QPen(colour, 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+    return colour_pen_lookup[colour]
+
+
+def get_colour_brush(colour: Qt.GlobalColor) -> QBrush:
+    """
+    Get the (shared) brush of a colour, so one isn't constructed every paint
+    :param colour: Colour of the brush
+    :return: Brush of colour
+    """
+    if colour not in colour_brush_lookup:
+        colour_brush_lookup[colour] = QBrush(colour)
+    return colour_brush_lookup[colour]
+
+
+text_bounds_lookup: Dict[Tuple[str, str], QRect] = {}
+
+
+def get_text_bounds(font: QFont, text: str) -> QRect:
+    """
+    Get the bounds of some text, only measuring each text (in each font) once
+    :param font: Font the text is drawn in
+    :param text: Text to measure
+    :return: Bounds of the text, a copy so it can be moved freely
+    """
+    text_key = (font.key(), text)
+    if text_key not in text_bounds_lookup:
+        text_bounds_lookup[text_key] = QFontMetrics(font).boundingRect(text)
+    return QRect(text_bounds_lookup[text_key])
+
+
+debug_font_lookup: Dict[int, QFont] = {}
+
+
+def get_debug_font(point_size: int) -> QFont:
+    """
+    Get the (shared) font debug text is drawn in, so text can be measured outside of paint
+    :param point_size: Point size of the font
+    :return: Application font at point_size
+    """
+    if point_size not in debug_font_lookup:
+        font = QFont(QApplication.font())
+        font.setPointSize(point_size)
+        debug_font_lookup[point_size] = font
+    return debug_font_lookup[point_size]
 
 
 class QtTrack(QtEdge):
+    item_type = QGraphicsItem.UserType + 4
+    ROUTE_LINE_WIDTH = 2.0
+
     def __init__(self, source_junction: 'QtNode', dest_junction: 'QtNode', track: Track):
         """
         Superclass of base edge that represents a Track
@@ -214,108 +361,209 @@ class QtTrack(QtEdge):
 
         self.track = track
         self.qt_train: Optional[QtTrain] = None
+        self._debug_text = f'Track({track.ident})'
+        # Pens of the trains routed along the track, only looked up again when the routes change
+        self._routed_trains: FrozenSet[Train] = frozenset()
+        self._route_pens: List[QPen] = []
+        # Everything drawn around the line, only laid out again when the line or the simulation changes
+        self._route_lines: List[Tuple[QPen, QLineF]] = []
+        self._signals: List[Tuple[Qt.GlobalColor, QRectF]] = []
+        self._signal_texts: List[Tuple[str, QRect]] = []
+        self._text_bounds = QRect()
+        # Bounds of the routes, signals and text drawn around the line
+        self.bounds = QRectF()
+        # Have Qt pass the exposed part of the track to paint, so signals and text outside it can be skipped
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        self.update_geometry()
 
-    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
+    def boundingRect(self) -> QRectF:
         """
-        Paint this QGraphicsItem
-        :param painter: QPainter instance for drawing
-        :param option: Styling options
-        :param widget: Optionally the widget that is being painted on
+        Return this QGraphicsItems bounding rectangle
+        :return: Object bounding rectangle
         """
-        if not self.source() or not self.dest():
-            log.warning(f'No source ({self.source()}) or dest ({self.dest()}) node. Nothing to paint')
-            return
-
-        # Draw the main connecting line (black line between nodes)
-        painter.setPen(QPen(Qt.black, 1, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-        painter.drawLine(self.connecting_line)
-        line_bounds = QRectF(self.connecting_line.p1(), self.connecting_line.p2()).normalized()
+        return super().boundingRect().united(self.bounds)
 
-        # Draw the train routes
-        track_line_bounds = []
-        connecting_line_unit_normal = self.connecting_line.unitVector().normalVector()
-        route_line_width = 2.0
-        for i, train_line in enumerate(self.track.trains_routed_along_track, start=1):
-            # Create copy of normal line
-            offset_line = QLineF(connecting_line_unit_normal.p1(), connecting_line_unit_normal.p2())
-            offset_line.setLength((i * route_line_width) - 0.5)  # normal offset increases with more track routes
-            track_line_bounds.append(QRectF(offset_line.p1(), offset_line.p2()).normalized())
-            offset_line_delta_point = QPointF(offset_line.dx(), offset_line.dy())
-
-            # Create copy of connecting line
-            track_line = QLineF(self.connecting_line.p1(), self.connecting_line.p2())
-            # Translate it by the offset line delta
-            track_line.translate(offset_line_delta_point)
-            track_colour = get_track_line_colour(train_line)
-            painter.setPen(QPen(track_colour, route_line_width, Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin))
-            painter.drawLine(track_line)
-            track_line_bounds.append(QRectF(track_line.p1(), track_line.p2()).normalized())
+    def adjust(self):
+        """
+        Update our connecting line geometry, and everything drawn around it
+        """
+        super().adjust()
+        # The base class constructor adjusts the line before there's a track to lay out around it
+        if hasattr(self, 'track'):
+            self.update_geometry()
 
+    def update_geometry(self):
+        """
+        Lay out the routes, signals and text drawn around the line (and the train on it),
+        and fit the bounds to them. Called when the line moves or the simulation advances
+        """
         # Create/delete a child train item if needed
         if self.track.train and not self.qt_train:
             self.qt_train = QtTrain(get_track_line_colour(self.track.train), parent=self)
+            self.qt_train.set_show_debug(self.show_debug)
             log.debug(f'Created QtTrain at {self.track}')
         elif not self.track.train and self.qt_train:
             log.debug(f'Deleting QtTrain from {self.track}')
             self.qt_train.setParentItem(None)
             del self.qt_train
             self.qt_train = None
-
-        font = painter.font()
-
-        # Draw any signals
-        signal_ellipse_bounds = []
+        if self.qt_train:
+            self.qt_train.update_geometry()
+
+        line_bounds = self.line_bounds
+
+        # The train routes, each offset a bit further along the line's normal
+        line = self.connecting_line
+        x1, y1, x2, y2 = line.x1(), line.y1(), line.x2(), line.y2()
+        # Accumulate the total bounds as plain floats, and only build the QRectF once at the end
+        min_x, max_x = min(x1, x2), max(x1, x2)
+        min_y, max_y = min(y1, y2), max(y1, y2)
+        normal_x, normal_y = self.line_unit_normal
+        route_line_width = self.ROUTE_LINE_WIDTH
+        if self.track.trains_routed_along_track != self._routed_trains:
+            self._routed_trains = frozenset(self.track.trains_routed_along_track)
+            self._route_pens = [get_track_line_pen(train_line) for train_line in self._routed_trains]
+        route_lines: List[Tuple[QPen, QLineF]] = []
+        for i, route_pen in enumerate(self._route_pens, start=1):
+            offset = (i * route_line_width) - 0.5  # normal offset increases with more track routes
+            offset_x = normal_x * offset
+            offset_y = normal_y * offset
+            route_lines.append((route_pen, QLineF(x1 + offset_x, y1 + offset_y, x2 + offset_x, y2 + offset_y)))
+        if route_lines:
+            # Together with the line itself, the furthest route bounds all the others
+            furthest_offset = (len(route_lines) * route_line_width) - 0.5
+            for route_x in (x1 + normal_x * furthest_offset, x2 + normal_x * furthest_offset):
+                min_x, max_x = min(min_x, route_x), max(max_x, route_x)
+            for route_y in (y1 + normal_y * furthest_offset, y2 + normal_y * furthest_offset):
+                min_y, max_y = min(min_y, route_y), max(max_y, route_y)
+
+        # Any signals
+        signals: List[Tuple[Qt.GlobalColor, QRectF]] = []
+        signal_texts: List[Tuple[str, QRect]] = []
         for train_signal in self.track.train_signals:
             signal_sim_junction = train_signal.attached_junction
             # connecting_line is always from source to dest, so we cheat a bit to not
             # have to figure out the geomerty from scratch again
-            if self.source().junction == signal_sim_junction:
-                signal_point = self.connecting_line.p1()
-            elif self.dest().junction == signal_sim_junction:
-                signal_point = self.connecting_line.p2()
+            if self.source.junction == signal_sim_junction:
+                signal_point = line.p1()
+            elif self.dest.junction == signal_sim_junction:
+                signal_point = line.p2()
             else:
                 raise IndexError(f'No attached junction for {train_signal}')
             signal_ellipse_bound = QRectF(-4, -4, 4, 4)
             signal_ellipse_bound.moveCenter(signal_point)
             signal_colour = Qt.green if train_signal.signal_state else Qt.red
-            painter.setPen(signal_colour)
-            painter.setBrush(signal_colour)
-            painter.drawEllipse(signal_ellipse_bound)
-            signal_ellipse_bounds.append(signal_ellipse_bound)
-
-            # Signal text
+            signals.append((signal_colour, signal_ellipse_bound))
+            signal_x, signal_y = signal_point.x(), signal_point.y()
+            min_x, max_x = min(min_x, signal_x - 2), max(max_x, signal_x + 2)
+            min_y, max_y = min(min_y, signal_y - 2), max(max_y, signal_y + 2)
             if self.show_debug:
                 text = f'Sig{train_signal.ident}'
-                font.setPointSize(5)
-                painter.setFont(font)
-                painter.setPen(Qt.black)
-                text_bounds = painter.fontMetrics().boundingRect(text)
+                text_bounds = get_text_bounds(get_debug_font(5), text)
                 text_bounds.moveTo(signal_ellipse_bound.center().toPoint())
-                painter.drawText(text_bounds, 0, text)
-                signal_ellipse_bounds.append(text_bounds)
+                signal_texts.append((text, text_bounds))
+                text_x, text_y, text_w, text_h = text_bounds.getRect()
+                min_x, max_x = min(min_x, text_x), max(max_x, text_x + text_w)
+                min_y, max_y = min(min_y, text_y), max(max_y, text_y + text_h)
 
-        # Draw text
+        # Text
+        text_bounds = QRect()
         if self.show_debug:
-            text = f'Track({self.track.ident})'
-            font.setPointSize(8)
-            painter.setFont(font)
-            painter.setPen(Qt.black)
-            text_bounds = painter.fontMetrics().boundingRect(text)
+            text_bounds = get_text_bounds(get_debug_font(8), self._debug_text)
             text_bounds.moveTo(line_bounds.center().toPoint())
-            painter.drawText(text_bounds, 0, text)
-        else:
-            text_bounds = QRectF()
+            text_x, text_y, text_w, text_h = text_bounds.getRect()
+            min_x, max_x = min(min_x, text_x), max(max_x, text_x + text_w)
+            min_y, max_y = min(min_y, text_y), max(max_y, text_y + text_h)
+
+        total_bounds = QRectF(min_x, min_y, max_x - min_x, max_y - min_y)
+
+        # Most simulation steps don't change most tracks, only repaint the ones that did change
+        content_changed = (
+            route_lines != self._route_lines
+            or signals != self._signals
+            or signal_texts != self._signal_texts
+            or text_bounds != self._text_bounds
+        )
+        self._route_lines = route_lines
+        self._signals = signals
+        self._signal_texts = signal_texts
+        self._text_bounds = text_bounds
+        if total_bounds != self.bounds:
+            self.prepareGeometryChange()
+            self.bounds = total_bounds
+            content_changed = True
+        if content_changed:
+            self.update()
+
+    def set_show_debug(self, show_debug: bool):
+        """
+        Show or hide the debug text of this track, and the train on it
+        :param show_debug: True to show the debug text, False to hide it
+        """
+        self.show_debug = show_debug
+        if self.qt_train:
+            self.qt_train.set_show_debug(show_debug)
+        self.update_geometry()
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
+        """
+        Paint this QGraphicsItem
+        :param painter: QPainter instance for drawing
+        :param option: Styling options
+        :param widget: Optionally the widget that is being painted on
+        """
+        exposed_rect = option.exposedRect
+        if exposed_rect.isEmpty():
+            return  # Nothing of the track needs repainting
+
+        # Axis aligned lines (and the routes parallel to them) look the same without antialiasing,
+        # and while the layout is moving everything it's not worth the cost
+        line = self.connecting_line
+        painter.setRenderHint(
+            QPainter.Antialiasing,
+            abs(line.dx()) > 0.5 and abs(line.dy()) > 0.5 and not self.source.graph.skip_antialiasing,
+        )
+        # Draw the main connecting line (black line between nodes)
+        super().paint(painter, option, widget)
 
-        total_bounds = line_bounds.united(text_bounds)
-        for track_line_bound in track_line_bounds:
-            total_bounds = total_bounds.united(track_line_bound)
-        for signal_ellipse_bound in signal_ellipse_bounds:
-            total_bounds = total_bounds.united(signal_ellipse_bound)
-        self.bounds = total_bounds
+        level_of_detail = option.levelOfDetailFromTransform(painter.worldTransform())
+        if level_of_detail < DETAIL_MIN_LEVEL_OF_DETAIL:
+            return  # Routes and signals would be specks
+        show_text = self.show_debug and level_of_detail >= TEXT_MIN_LEVEL_OF_DETAIL
 
+        # Draw the train routes
+        for route_pen, route_line in self._route_lines:
+            painter.setPen(route_pen)
+            painter.drawLine(route_line)
+
+        # Draw any signals, only switching pens when the signal colour changes
+        last_signal_colour = None
+        for signal_colour, signal_ellipse_bound in self._signals:
+            if not exposed_rect.intersects(signal_ellipse_bound):
+                continue
+            if signal_colour != last_signal_colour:
+                painter.setPen(get_colour_pen(signal_colour))
+                painter.setBrush(get_colour_brush(signal_colour))
+                last_signal_colour = signal_colour
+            painter.drawEllipse(signal_ellipse_bound)
 
-class QtNode(QGraphicsItem):
+        # Draw text
+        if show_text:
+            painter.setPen(get_colour_pen(Qt.black))
+            painter.setFont(get_debug_font(5))
+            for text, text_bounds in self._signal_texts:
+                if exposed_rect.intersects(text_bounds):
+                    painter.drawText(text_bounds, 0, text)
+            if exposed_rect.intersects(self._text_bounds):
+                painter.setFont(get_debug_font(8))
+                painter.drawText(self._text_bounds, 0, self._debug_text)
+
+
+class QtNode(QGraphicsEllipseItem):
     item_type = QGraphicsItem.UserType + 1
+    # Brushes never change, so share them instead of constructing them for every node
+    _BRUSH = QBrush(Qt.darkGray)
+    _SUNKEN_BRUSH = QBrush(Qt.yellow)
 
     def __init__(self, graph_widget: 'GraphWidget'):
         """
@@ -324,151 +572,92 @@ class QtNode(QGraphicsItem):
         """
         super().__init__()
 
-        self.graph = weakref.ref(graph_widget)
-        self._edge_list: List[weakref.ReferenceType[QtEdge]] = []
-        self._new_pos = QPointF()
-        self.bounds = QRectF()
+        # The graph widget owns the scene, so it always outlives its nodes
+        self.graph: 'GraphWidget' = graph_widget
+        self.index = -1  # Index into the graph widget's position arrays
+        self._edge_list: List[QtEdge] = []
         self.circle_radius = 20
         self.circle_bounds = QRectF(
             -self.circle_radius / 2, -self.circle_radius / 2, self.circle_radius, self.circle_radius
         )
+        # Let Qt draw the circle itself, without calling back into Python every paint
+        self.setRect(self.circle_bounds)
+        self.setPen(Qt.NoPen)
+        self.setBrush(self._BRUSH)
         self.setFlag(QGraphicsItem.ItemIsMovable)
-        self.setFlag(QGraphicsItem.ItemSendsGeometryChanges)
-        self.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+        # Cache in item coordinates, so zooming/panning the view reuses the cached pixmap
+        # instead of re-rendering every node. At twice the item's size, so it stays sharp
+        # on HiDPI screens and when zoomed in a bit
+        self.setCacheMode(QGraphicsItem.ItemCoordinateCache, (self.circle_bounds.size() * 2).toSize())
         self.setZValue(-1)
         self.show_debug = False
 
+    def set_show_debug(self, show_debug: bool):
+        """
+        Show or hide the debug text of this node
+        :param show_debug: True to show the debug text, False to hide it
+        """
+        self.show_debug = show_debug
+        self.update()
+
     def add_edge(self, edge: QtEdge):
         """
         Add an edge to this node
         :param edge: Edge to add
         """
-        self._edge_list.append(weakref.ref(edge))
+        self._edge_list.append(edge)
         edge.adjust()
 
-    def calculate_forces(self):
-        """
-        Calculate all the forces acting on this node
-        """
-        if not self.scene() or self.scene().mouseGrabberItem() is self:
-            self._new_pos = self.pos()
-            return
-
-        # Sum up all forces pushing this item away.
-        xvel = 0.0
-        yvel = 0.0
-        for item in self.scene().items():
-            if not isinstance(item, QtNode):
-                continue
-
-            line = QLineF(self.mapFromItem(item, 0, 0), QPointF(0, 0))
-            dx = line.dx()
-            dy = line.dy()
-            l = 2.0 * (dx * dx + dy * dy)
-            if l > 0:
-                xvel += (dx * 150.0) / l
-                yvel += (dy * 150.0) / l
-
-        # Now subtract all forces pulling items together.
-        weight = (len(self._edge_list) + 1) * 10.0
-        for edge in self._edge_list:
-            if edge().source() is self:
-                pos = self.mapFromItem(edge().dest(), 0, 0)
-            else:
-                pos = self.mapFromItem(edge().source(), 0, 0)
-            xvel += pos.x() / weight
-            yvel += pos.y() / weight
-
-        if qAbs(xvel) < 0.1 and qAbs(yvel) < 0.1:
-            xvel = yvel = 0.0
-
-        scene_rect = self.scene().sceneRect()
-        self._new_pos = self.pos() + QPointF(xvel, yvel)
-        radius_offset = self.circle_radius / 2
-        self._new_pos.setX(
-            min(max(self._new_pos.x(), scene_rect.left() + radius_offset), scene_rect.right() - radius_offset)
-        )
-        self._new_pos.setY(
-            min(max(self._new_pos.y(), scene_rect.top() + radius_offset), scene_rect.bottom() - radius_offset)
-        )
-
-    def advance(self, phase: int = 0) -> bool:
+    def clear_edges(self):
         """
-        Set our new position from our latest calculation
-        :param phase: Optional phase number for animation
-        :return: True if our position changed, else False
+        Forget all the edges of this node, for when the graph is being torn down
         """
-        if self._new_pos == self.pos():
-            return False
-
-        self.setPos(self._new_pos)
-        return True
+        self._edge_list.clear()
 
-    def boundingRect(self) -> QRectF:
+    def type(self) -> int:
         """
-        Return this QGraphicsItems bounding rectangle
-        :return: Object bounding rectangle
+        Return this QGraphicsItems type, so it can be identified without isinstance
+        :return: Item type
         """
-        return self.bounds
-
-    def shape(self) -> QPainterPath:
-        """
-        Get the shape of this QGraphicsItem
-        :return: Shape of this QGraphicsItem
-        """
-        path = QPainterPath()
-        path.addEllipse(self.circle_bounds)
-        return path
-
-    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
-        """
-        Paint this QGraphicsItem
-        :param painter: QPainter instance for drawing
-        :param option: Styling options
-        :param widget: Optionally the widget that is being painted on
-        """
-        # Basic circle
-        painter.setPen(Qt.NoPen)
-        if option.state & QStyle.State_Sunken:
-            # Click and drag
-            painter.setBrush(Qt.yellow)
-        else:
-            painter.setBrush(Qt.darkGray)
-        painter.drawEllipse(self.circle_bounds)
-        self.bounds = self.circle_bounds
-
-    def itemChange(self, change: QGraphicsItem.GraphicsItemChange, value):
-        """
-        Called to notify that some part of the item's state has changed
-        :param change: Type of change
-        :param value: The new value
-        :return: Parent itemChange implementation
-        """
-        if change == QGraphicsItem.ItemPositionChange:
-            for edge in self._edge_list:
-                edge().adjust()
-            self.graph().item_moved()
-
-        return QGraphicsItem.itemChange(self, change, value)
+        return self.item_type
 
     def mousePressEvent(self, event):
         """
         Called when the mouse presses this QGraphicsItem
         :param event: The type of mouse event
         """
-        self.update()
+        # Highlight while clicking and dragging. setBrush only repaints if the brush actually changes
+        if event.button() == Qt.LeftButton:
+            self.setBrush(self._SUNKEN_BRUSH)
         QGraphicsItem.mousePressEvent(self, event)
 
+    def mouseMoveEvent(self, event):
+        """
+        Called when the mouse moves while dragging this QGraphicsItem
+        :param event: The type of mouse event
+        """
+        QGraphicsItem.mouseMoveEvent(self, event)
+        # Nodes don't send geometry changes (that would call back into Python for every move
+        # the layout makes), so tell the graph about the drag here
+        self.graph.mark_edges_dirty(self._edge_list)
+        self.graph.item_moved()
+
     def mouseReleaseEvent(self, event):
         """
         Called when the mouse releases this QGraphicsItem
         :param event: The type of mouse event
         """
-        self.update()
+        self.setBrush(self._BRUSH)
         QGraphicsItem.mouseReleaseEvent(self, event)
 
 
 class QtJunction(QtNode):
+    item_type = QGraphicsItem.UserType + 3
+    _TEXT_PEN = QPen(Qt.black)
+    _FORK_PEN = QPen(Qt.red)
+    # Render the shared pixmaps at twice the resolution, so they stay sharp when zoomed in a bit
+    _PIXMAP_SCALE = 2.0
+
     def __init__(self, graph_widget: 'GraphWidget', junction: Junction):
         """
         Superclass of base node that represents a Junction
@@ -477,44 +666,138 @@ class QtJunction(QtNode):
         """
         super().__init__(graph_widget)
         self.junction = junction
-        self.fork_qt_notes: Optional[Tuple[weakref.ReferenceType['QtNode'], weakref.ReferenceType['QtNode']]] = None
+        self._debug_text = f'Junction({junction.ident})'
+        # Bounds of the circle, and the text drawn around it
+        self.bounds = QRectF(self.circle_bounds)
+        self.fork_qt_notes: Optional[Tuple[QtNode, QtNode]] = None
+        # Switch state the forks were last updated for
+        self._switch_state: Optional[Tuple[Junction, Junction]] = None
+        # Key of the shared pixmap this junction is drawn from, only made again after the brush or text changes
+        self._pixmap_key: Optional[str] = None
+        # Have Qt fill in option.exposedRect, so paint can skip repaints that don't show any of the junction
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption)
+        # The forks move with the nodes, so an item cache would be invalidated every tick anyway.
+        # Instead the rest of the junction is drawn from a pixmap shared by all the junctions
+        self.setCacheMode(QGraphicsItem.NoCache)
+
+    def boundingRect(self) -> QRectF:
+        """
+        Return this QGraphicsItems bounding rectangle
+        :return: Object bounding rectangle
+        """
+        return super().boundingRect().united(self.bounds)
 
     def update_fork_nodes(self):
         """
-        Update our representation of which nodes the forks are connecting
-        """
-        # Find the two edges from the fork identifiers
-        qt_node_forks = []
-        for qt_edge in self._edge_list:
-            edge_node1: weakref.ReferenceType[QtNode] = qt_edge().source()
-            edge_node2: weakref.ReferenceType[QtNode] = qt_edge().dest()
-            switch_junct1, switch_junct2 = self.junction.get_switch_state()
-            # forks could be the same, can't use elif or compact into a single if
-            if edge_node1.junction == switch_junct1:
-                qt_node_forks.append(edge_node1)
-            if edge_node1.junction == switch_junct2:
-                qt_node_forks.append(edge_node1)
-            if edge_node2.junction == switch_junct1:
-                qt_node_forks.append(edge_node2)
-            if edge_node2.junction == switch_junct2:
-                qt_node_forks.append(edge_node2)
-            if len(qt_node_forks) == 2:
-                break  # Found both forks
-        if len(qt_node_forks) < 2:
+        Update our representation of which nodes the forks are connecting, and repaint if it changed
+        """
+        if not self._edge_list:
+            return  # Not connected to anything, so there's nothing to fork to
+        switch_state = self.junction.get_switch_state()
+        if switch_state == self._switch_state:
+            return  # Only a few junctions switch each step
+        switch_junct1, switch_junct2 = switch_state
+        sim_obj_to_node = self.graph.sim_obj_to_node
+        qt_node_fork1 = sim_obj_to_node.get(switch_junct1)
+        qt_node_fork2 = sim_obj_to_node.get(switch_junct2)
+        if qt_node_fork1 is None or qt_node_fork2 is None:
             # Forks not found, no update
             return
-        if len(qt_node_forks) > 2:
-            raise IndexError(f'Found more than 2 fork nodes? {qt_node_forks}')
-        self.fork_qt_notes = (qt_node_forks[0], qt_node_forks[1])
+        self._switch_state = switch_state
+        self.fork_qt_notes = (qt_node_fork1, qt_node_fork2)
+        self.update()
 
-    def add_edge(self, edge):
+    def clear_edges(self):
         """
-        Add an edge to this node
-        :param edge: Edge to add
+        Forget all the edges of this junction, and the nodes its forks connect to
         """
-        super().add_edge(edge)
-        # Update our fork references if we're a Junction,
-        self.update_fork_nodes()
+        super().clear_edges()
+        self.fork_qt_notes = None
+        self._switch_state = None
+
+    def set_show_debug(self, show_debug: bool):
+        """
+        Show or hide the debug text of this junction, and fit the bounds to it
+        :param show_debug: True to show the debug text, False to hide it
+        """
+        super().set_show_debug(show_debug)
+        body_bounds = QRectF(self.circle_bounds)
+        if show_debug:
+            text_bounds = get_text_bounds(get_debug_font(8), self._debug_text)
+            text_bounds.moveTo(self.circle_bounds.center().toPoint())
+            body_bounds = body_bounds.united(text_bounds)
+        if body_bounds != self.bounds:
+            self.prepareGeometryChange()
+            self.bounds = body_bounds
+        self._pixmap_key = None
+
+    def setBrush(self, brush: QBrush):
+        """
+        Set the brush the circle is filled with
+        :param brush: The new brush
+        """
+        super().setBrush(brush)
+        self._pixmap_key = None
+
+    def make_pixmap_key(self) -> str:
+        """
+        Make the key the pixmap of this junction is cached under, every junction
+        with the same brush and text shares the same pixmap
+        :return: Pixmap cache key
+        """
+        text = self._debug_text if self.show_debug else ''
+        return f'QtJunction:{self.brush().color().rgba()}:{text}'
+
+    def body_pixmap(self) -> QPixmap:
+        """
+        Get the circle (and debug text) of this junction rendered to a pixmap, to be drawn at the
+        top left of the bounds. Every junction with the same brush and text looks identical, so
+        they all share the same cached pixmaps
+        :return: The pixmap
+        """
+        text = self._debug_text if self.show_debug else ''
+        body_bounds = self.bounds
+        if self._pixmap_key is None:
+            self._pixmap_key = self.make_pixmap_key()
+        pixmap_key = self._pixmap_key
+        pixmap = QPixmapCache.find(pixmap_key)
+        if pixmap is None or pixmap.isNull():
+            pixmap = QPixmap((body_bounds.size() * self._PIXMAP_SCALE).toSize())
+            pixmap.setDevicePixelRatio(self._PIXMAP_SCALE)
+            pixmap.fill(Qt.transparent)
+            pixmap_painter = QPainter(pixmap)
+            pixmap_painter.setRenderHint(QPainter.Antialiasing)
+            pixmap_painter.translate(-body_bounds.topLeft())
+            pixmap_painter.setPen(Qt.NoPen)
+            pixmap_painter.setBrush(self.brush())
+            pixmap_painter.drawEllipse(self.circle_bounds)
+            if text:
+                font = get_debug_font(8)
+                text_bounds = get_text_bounds(font, text)
+                text_bounds.moveTo(self.circle_bounds.center().toPoint())
+                pixmap_painter.setFont(font)
+                pixmap_painter.setPen(self._TEXT_PEN)
+                pixmap_painter.drawText(text_bounds, text)
+            pixmap_painter.end()
+            QPixmapCache.insert(pixmap_key, pixmap)
+        return pixmap
+
+    def fork_line(self, x: float, y: float, fork_node: QtNode) -> QLineF:
+        """
+        Get the line from the center of the circle to its edge, pointing towards a fork node
+        :param x: Our X position
+        :param y: Our Y position
+        :param fork_node: Node the fork connects to
+        :return: Fork line in item coordinates
+        """
+        fork_x, fork_y = fork_node.pos().toTuple()
+        dx = fork_x - x
+        dy = fork_y - y
+        length = math.hypot(dx, dy)
+        if length == 0.0:
+            return QLineF()
+        scale = self.circle_radius / 2 / length
+        return QLineF(0.0, 0.0, dx * scale, dy * scale)
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = None):
         """
@@ -523,46 +806,83 @@ class QtJunction(QtNode):
         :param option: Styling options
         :param widget: Optionally the widget that is being painted on
         """
-        # Draw circle
-        painter.setPen(Qt.NoPen)
-        if option.state & QStyle.State_Sunken:
-            # Click and drag
-            painter.setBrush(Qt.yellow)
-        else:
-            painter.setBrush(Qt.darkGray)
-        painter.drawEllipse(self.circle_bounds)
+        if option.exposedRect.isEmpty():
+            return  # Nothing of the junction needs repainting
 
-        # Draw text
-        if self.show_debug:
-            font = painter.font()
-            text = f'Junction({self.junction.ident})'
-            font.setPointSize(8)
-            painter.setFont(font)
-            painter.setPen(QPen(Qt.black))
-            text_bounds = painter.fontMetrics().boundingRect(text)
-            text_bounds.moveTo(self.circle_bounds.center().toPoint())
-            painter.drawText(text_bounds, text)
-        else:
-            text_bounds = QRectF()
+        # Draw circle and text
+        painter.drawPixmap(self.bounds.topLeft(), self.body_pixmap())
 
         # Draw fork
         if self.fork_qt_notes is not None:
             qt_node_fork1, qt_node_fork2 = self.fork_qt_notes
-            line1 = QLineF(QPointF(0, 0), self.mapFromItem(qt_node_fork1, QPointF(0, 0)))
-            line2 = QLineF(QPointF(0, 0), self.mapFromItem(qt_node_fork2, QPointF(0, 0)))
-            line1.setLength(self.circle_radius / 2)
-            line2.setLength(self.circle_radius / 2)
-            painter.setPen(QPen(Qt.red))
-            painter.drawLine(line1)
-            painter.drawLine(line2)
+            # Nodes have no parent or transform, so mapping between them is just a translation
+            x, y = self.pos().toTuple()
+            painter.setRenderHint(QPainter.Antialiasing, not self.graph.skip_antialiasing)
+            painter.setPen(self._FORK_PEN)
+            painter.drawLines([self.fork_line(x, y, qt_node_fork1), self.fork_line(x, y, qt_node_fork2)])
         else:
             log.error(f'No fork nodes for {self.junction.ident}')
 
-        # calculate item bounds
-        self.bounds = self.circle_bounds.united(text_bounds)
+
+class PhysicsWorker(QObject):
+    # Emitted with (layout generation, new node positions, largest squared node displacement) after each layout step.
+    # The positions are None if the step was skipped
+    positions_ready = Signal(int, object, float)
+
+    def __init__(self):
+        """
+        Worker that calculates the force directed layout, off of the GUI thread
+        """
+        super().__init__()
+        self._edge_index = np.zeros((0, 2), dtype=np.int32)
+        self._weights = np.zeros(0, dtype=POSITION_DTYPE)
+        self._min_positions = np.zeros((0, 2), dtype=POSITION_DTYPE)
+        self._max_positions = np.zeros((0, 2), dtype=POSITION_DTYPE)
+
+    @Slot(object, object, object, object)
+    def set_graph(
+        self, edge_index: np.ndarray, weights: np.ndarray, min_positions: np.ndarray, max_positions: np.ndarray
+    ):
+        """
+        Set the graph that the layout is calculated for
+        :param edge_index: (E, 2) array of node indices that each edge connects
+        :param weights: (N,) array of how strongly each node resists being pulled
+        :param min_positions: (N, 2) array of the lowest position each node can move to
+        :param max_positions: (N, 2) array of the highest position each node can move to
+        """
+        self._edge_index = edge_index
+        self._weights = weights
+        self._min_positions = min_positions
+        self._max_positions = max_positions
+
+    @Slot(int, object, float)
+    def step(self, generation: int, positions: np.ndarray, alpha: float):
+        """
+        Calculate one layout step, and emit the new positions
+        :param generation: Layout generation the positions belong to, passed through with the result
+        :param positions: (N, 2) array of the current node positions
+        :param alpha: How hot the layout is, scales all the velocities down as it cools
+        """
+        if len(positions) != len(self._weights):
+            log.warning(f'Layout step with {len(positions)} positions for {len(self._weights)} nodes, skipping')
+            self.positions_ready.emit(generation, None, 0.0)
+            return
+        new_positions = layout_step(
+            positions, self._edge_index, self._weights, self._min_positions, self._max_positions, alpha
+        )
+        # Measured here too, so the GUI thread doesn't have to compare every position to tell if it settled
+        self.positions_ready.emit(generation, new_positions, max_displacement_squared(positions, new_positions))
 
 
 class GraphWidget(QGraphicsView):
+    # Signals to the physics worker thread
+    graph_changed = Signal(object, object, object, object)
+    step_requested = Signal(int, object, float)
+    # Layout timer interval, 25 ticks per second, if the screen's refresh rate isn't known
+    _LAYOUT_INTERVAL_MS = 1000 // 25
+    # Node moves shorter than this (squared) aren't worth the setPos and edge adjusting
+    _MIN_MOVE_SQUARED = 0.01
+
     def __init__(self):
         """
         QGraphicsItem representing the whole graph
@@ -570,14 +890,67 @@ class GraphWidget(QGraphicsView):
         super().__init__()
 
         self._timer_id = 0
+        # Whether the view antialiases everything while the layout isn't running
+        self._view_antialiasing = False
+        # Whether the viewport renders with OpenGL, where multisampling antialiases everything anyway
+        self._opengl_viewport = USE_OPENGL_VIEWPORT
+        # Cache the nodes and edges so the scene doesn't need to be searched for them every tick
+        self._nodes: List[QtNode] = []
+        self._edges: List[QtEdge] = []
+        self.sim_obj_to_node: Dict[SimObject, QtNode] = {}
+        self._junctions: List[QtJunction] = []
+        # Structure of arrays representation of the graph, for calculating forces
+        self._pos = np.zeros((0, 2), dtype=POSITION_DTYPE)
+        # The layout owns the positions in _pos, they only need reading back from the
+        # scene after something else (dragging, randomizing) moves the nodes
+        self._pos_needs_sync = True
+        # Where the node items actually are, which lags behind _pos for nodes that only moved a little
+        self._item_pos = np.zeros((0, 2), dtype=POSITION_DTYPE)
+        self._rng = np.random.default_rng()
+        self._weights = np.zeros(0, dtype=POSITION_DTYPE)
+        self._edge_index = np.zeros((0, 2), dtype=np.int32)
+        # Incremented whenever the graph changes, so stale layout results can be dropped
+        self._layout_generation = 0
+        self._layout_step_pending = False
+        # Cooling schedule, like d3-force. The layout stops once alpha decays below alpha_min,
+        # and moving an item heats it back up
+        self._alpha = 1.0
+        self._alpha_min = 0.001
+        self._alpha_decay = 0.02
+        # Edges that need adjusting after a batch of node moves, or on the next layout tick
+        self.dirty_edges: Set[QtEdge] = set()
+
+        # Calculate the layout on a separate thread, so long steps don't block the GUI
+        self._physics_thread = QThread(self)
+        self._physics_worker = PhysicsWorker()
+        self._physics_worker.moveToThread(self._physics_thread)
+        self.graph_changed.connect(self._physics_worker.set_graph)
+        self.step_requested.connect(self._physics_worker.step)
+        self._physics_worker.positions_ready.connect(self.apply_layout_step)
+        QApplication.instance().aboutToQuit.connect(self.stop_physics_thread)
+        self._physics_thread.start()
 
         scene = QGraphicsScene(self)
-        scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+        # Every item reports its bounds up front, so the default BspTreeIndex can be trusted from the start.
+        # It's only dropped while the layout moves every node each tick, see item_moved() and stop_layout_timer()
+        scene.setBspTreeDepth(0)  # Let Qt pick the depth from the number of items
         self.scene_size = 1000
         scene.setSceneRect(-self.scene_size / 2, -self.scene_size / 2, self.scene_size, self.scene_size)
         self.setScene(scene)
         self.setCacheMode(QGraphicsView.CacheBackground)
-        self.setRenderHint(QPainter.Antialiasing)
+        if self._opengl_viewport:
+            # Let the GPU do the rasterizing, where antialiasing everything is cheap
+            surface_format = QSurfaceFormat()
+            surface_format.setSamples(OPENGL_SAMPLES)
+            viewport = QOpenGLWidget()
+            viewport.setFormat(surface_format)
+            self.setViewport(viewport)
+            self.setRenderHint(QPainter.Antialiasing)
+            self._view_antialiasing = True
+            # An OpenGL viewport redraws all of itself every frame anyway, so working out
+            # the minimal region to repaint is wasted time
+            self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        # Otherwise no antialiasing by default, it's only turned on for the items that need it
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setResizeAnchor(QGraphicsView.AnchorViewCenter)
         self.scale(0.8, 0.8)
@@ -590,23 +963,22 @@ class GraphWidget(QGraphicsView):
         :param new_simulation: The new simulation graph
         """
         self.simulation = new_simulation
+        self.clear_graph()
 
-        # Clear the scene
-        for item in self.scene().items():
-            if item.parentItem() is not None:
-                self.scene().removeItem(item)
-        self.scene().clear()
-
-        graph_data = nx.to_dict_of_dicts(self.simulation.graph)
-
-        log.debug(f'Creating graphics representation of:\n{graph_data}')
+        graph = self.simulation.graph
+        # Only build the (large) dict of the whole graph if it's actually going to be logged
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(f'Creating graphics representation of:\n{nx.to_dict_of_dicts(graph)}')
 
         # First need to add all create a QtNode for every node id
         nodes: Dict[SimObject, QtNode] = {}
-        for node_start_obj in graph_data.keys():
+        # Binned by type as they're made, so the per-step loops never have to check item types
+        junctions: List[QtJunction] = []
+        for node_start_obj in graph.nodes:
             # Convert simulation types into graphics types
             if isinstance(node_start_obj, Junction):
                 node = QtJunction(self, node_start_obj)
+                junctions.append(node)
             else:
                 log.warning(f'Unknown node type: {node_start_obj}')
                 node = QtNode(self)
@@ -614,27 +986,42 @@ class GraphWidget(QGraphicsView):
 
         # Then we can go through and create a QtEdge containing two QtNodes
         edges: List[QtEdge] = []
-        for node_start_obj, edge_connection_dict in graph_data.items():
-            for node_end_obj, edge_data in edge_connection_dict.items():
-                # Skip any edges that already connect the two nodes
-                edge_already_connected = False
-                for edge in edges:
-                    edge_node_tup = (edge.source().junction, edge.dest().junction)
-                    source_already_connected = node_start_obj in edge_node_tup
-                    dest_already_connected = node_end_obj in edge_node_tup
-                    if source_already_connected and dest_already_connected:
-                        edge_already_connected = True
-                if edge_already_connected:
-                    continue
-
-                # Convert simulation types into graphics types
-                edge_obj = edge_data['object']
-                if isinstance(edge_obj, Track):
-                    edge = QtTrack(nodes[node_start_obj], nodes[node_end_obj], edge_obj)
-                else:
-                    log.warning(f'Unknown edge type: {edge_obj}')
-                    edge = QtEdge(nodes[node_start_obj], nodes[node_end_obj])
-                edges.append(edge)
+        # The graph is undirected, so this has every edge once, no matter which end it's seen from
+        for node_start_obj, node_end_obj, edge_obj in graph.edges(data='object'):
+            # Convert simulation types into graphics types
+            if isinstance(edge_obj, Track):
+                edge = QtTrack(nodes[node_start_obj], nodes[node_end_obj], edge_obj)
+            else:
+                log.warning(f'Unknown edge type: {edge_obj}')
+                edge = QtEdge(nodes[node_start_obj], nodes[node_end_obj])
+            edges.append(edge)
+
+        # Set up the arrays used for calculating forces, indexed by each node's index
+        self._nodes = list(nodes.values())
+        self._junctions = junctions
+        self.sim_obj_to_node = nodes
+        for junction in self._junctions:
+            junction.update_fork_nodes()
+        for node_idx, node in enumerate(self._nodes):
+            node.index = node_idx
+        self._pos = np.zeros((len(nodes), 2), dtype=POSITION_DTYPE)
+        self._item_pos = np.zeros((len(nodes), 2), dtype=POSITION_DTYPE)
+        edge_index = np.array([(edge.source.index, edge.dest.index) for edge in edges], dtype=np.int32).reshape(-1, 2)
+        # Sorted by node index, so the attraction walks through the positions in order instead of jumping around.
+        # The edges are sorted the same way, so their indices line up with the edge index
+        edge_index.sort(axis=1)
+        edge_order = np.lexsort((edge_index[:, 1], edge_index[:, 0]))
+        self._edge_index = edge_index[edge_order]
+        self._edges = [edges[edge_idx] for edge_idx in edge_order.tolist()]
+        node_degrees = np.bincount(self._edge_index.ravel(), minlength=len(nodes))
+        self._weights = ((node_degrees + 1) * 10.0).astype(POSITION_DTYPE)
+        # Keep the nodes inside the scene
+        scene_rect = self.scene().sceneRect()
+        radius_offsets = np.array([node.circle_radius / 2 for node in self._nodes], dtype=POSITION_DTYPE)[:, None]
+        min_positions = np.array([scene_rect.left(), scene_rect.top()], dtype=POSITION_DTYPE) + radius_offsets
+        max_positions = np.array([scene_rect.right(), scene_rect.bottom()], dtype=POSITION_DTYPE) - radius_offsets
+        self._layout_generation += 1
+        self.graph_changed.emit(self._edge_index, self._weights, min_positions, max_positions)
 
         # Then we add all the Qt objects to the scene
         for node in nodes.values():
@@ -644,6 +1031,29 @@ class GraphWidget(QGraphicsView):
 
         self.randomize_nodes()
 
+    def clear_graph(self):
+        """
+        Remove all the nodes and edges from the scene. They reference each other directly, so
+        the references are dropped first, letting Python free them without waiting for the
+        cycle collector
+        """
+        # Any edges still waiting to be adjusted are going away too
+        self.dirty_edges.clear()
+        # The new graph's items are randomized and laid out right after being added, so don't
+        # index them where they start. The index is rebuilt once the layout stops
+        self.scene().setItemIndexMethod(QGraphicsScene.NoIndex)
+        # Only edges have children (their trains), so there's no need to search the whole scene for them
+        for edge in self._edges:
+            for child_item in edge.childItems():
+                self.scene().removeItem(child_item)
+        for node in self._nodes:
+            node.clear_edges()
+        self._nodes = []
+        self._edges = []
+        self._junctions = []
+        self.sim_obj_to_node = {}
+        self.scene().clear()
+
     def advance_simulation(self) -> Tuple[bool, int]:
         """
         Advance the simulation one time step
@@ -656,42 +1066,124 @@ class GraphWidget(QGraphicsView):
             log.warning(f'No simulation to advance: {self.simulation}')
             return False, -1
         sim_finished = not self.simulation.advance()
-        # Update all the fork nodes in case any junctions switched
-        for item in self.scene().items():
-            if isinstance(item, QtJunction):
-                item.update_fork_nodes()
-        # Force repaint
-        self.repaint_all(force_paint=True)
+        # Update all the fork nodes in case any junctions switched. Nothing else about
+        # the nodes depends on the simulation, so only switched junctions get repainted
+        for junction in self._junctions:
+            junction.update_fork_nodes()
+        # Lay out the routes, signals and trains again, which also repaints the edges
+        for edge in self._edges:
+            edge.update_geometry()
         return sim_finished, self.simulation.step
 
-    def repaint_all(self, force_paint=False):
+    def set_show_debug(self, show_debug: bool):
         """
-        Repaint all the items in the scene
-        :param force_paint: True if we want to repaint ourself as well, False otherwise
+        Show or hide the debug text of all the items in the graph
+        :param show_debug: True to show the debug text, False to hide it
         """
-        if force_paint:
-            self.repaint()
-            self.scene().update()
-        for item in self.scene().items():
-            item.update()
-        if force_paint:
-            self.repaint()
-            self.scene().update()
+        for node in self._nodes:
+            node.set_show_debug(show_debug)
+        for edge in self._edges:
+            edge.set_show_debug(show_debug)
 
     def randomize_nodes(self):
         """
         Randomize all the position of all the nodes in the scene
         """
-        for item in self.scene().items():
-            if isinstance(item, QtNode):
-                item.setPos(-150 + random.randint(0, 300), -150 + random.randint(0, 300))
+        # Any step the worker is still calculating is for the old positions, and would move the nodes back.
+        # It's still pending though, its result is dropped (and frees the worker) when it arrives
+        self._layout_generation += 1
+        # Generate all the positions in one go, straight into the layout's positions so
+        # they don't have to be read back from the scene
+        self._pos[:] = self._rng.integers(-150, 151, size=(len(self._nodes), 2))
+        with self.batched_node_moves():
+            for node, (x, y) in zip(self._nodes, self._pos.tolist()):
+                node.setPos(x, y)
+            self.mark_edges_dirty(self._edges)
+        self.item_moved()
+        self._item_pos[:] = self._pos
+        self._pos_needs_sync = False
+
+    @contextlib.contextmanager
+    def batched_node_moves(self) -> Iterator[None]:
+        """
+        Context manager to move many nodes at once. Instead of adjusting a
+        node's edges every time it moves, every moved edge is adjusted once at the end
+        """
+        try:
+            yield
+        finally:
+            self.flush_dirty_edges()
+
+    def mark_edges_dirty(self, edges: List[QtEdge]):
+        """
+        Mark edges as needing adjusting, because one of their nodes moved. Outside
+        of a batch of node moves they're adjusted on the next layout tick, which moving a
+        node keeps running, so dragging a node adjusts its edges once per frame instead of
+        on every mouse move event
+        :param edges: Edges to adjust
+        """
+        self.dirty_edges.update(edges)
+
+    def flush_dirty_edges(self):
+        """
+        Adjust all the edges that were marked dirty since the last flush
+        """
+        # The fork lines of the nodes at either end point along the edges, so they need repainting too
+        edge_nodes: Set[QtNode] = set()
+        for edge in self.dirty_edges:
+            edge.adjust()
+            edge_nodes.add(edge.source)
+            edge_nodes.add(edge.dest)
+        self.dirty_edges.clear()
+        for node in edge_nodes:
+            # Moving an item already repaints it, only the fork lines depend on where the neighbouring nodes are
+            if node.type() == QtJunction.item_type and node.fork_qt_notes is not None:
+                node.update()
+
+    @property
+    def skip_antialiasing(self) -> bool:
+        """
+        Whether items should skip antialiasing, to draw faster while the layout is moving them.
+        Multisampling on an OpenGL viewport antialiases for free, so there's nothing to skip there
+        :return: True while the layout is running on a raster viewport, else False
+        """
+        return self.layout_running and not self._opengl_viewport
+
+    @property
+    def layout_running(self) -> bool:
+        """
+        Whether the layout is currently moving the nodes
+        :return: True while the layout timer is running, else False
+        """
+        return self._timer_id != 0
+
+    def layout_interval_ms(self) -> int:
+        """
+        Get how often the layout should step, once per frame of the screen the graph is shown on
+        :return: Layout timer interval in milliseconds
+        """
+        screen = self.screen()
+        refresh_rate = screen.refreshRate() if screen is not None else 0.0
+        if refresh_rate <= 0.0:
+            return self._LAYOUT_INTERVAL_MS
+        return max(1, round(1000 / refresh_rate))
 
     def item_moved(self):
         """
         Called whenever an item in the scene is moved
         """
+        self._alpha = 1.0
+        self._pos_needs_sync = True
         if not self._timer_id:
-            self._timer_id = self.startTimer(1000 / 25)
+            # Items are about to move every tick, so stop maintaining the index, and
+            # don't spend time antialiasing frames that are only on screen for a moment.
+            # Multisampling makes antialiasing free on an OpenGL viewport, so it's left alone there
+            self.scene().setItemIndexMethod(QGraphicsScene.NoIndex)
+            if not self._opengl_viewport:
+                self.setRenderHint(QPainter.Antialiasing, False)
+            # Tick once per frame of the screen the graph is on, since steps in between frames are never seen.
+            # Precise, so the ticks don't drift in and out of step with the frames
+            self._timer_id = self.startTimer(self.layout_interval_ms(), Qt.PreciseTimer)
 
     def keyPressEvent(self, event):
         """
@@ -711,26 +1203,111 @@ class GraphWidget(QGraphicsView):
 
     def timerEvent(self, event):
         """
-        Main widget timer that calculates forces and paints items
+        Main widget timer that requests layout steps
         :param event: Timer event data
         """
-        # Just repaint everything for now. Don't really want to optimize the logic
-        self.repaint_all()
+        self.flush_dirty_edges()
 
-        nodes = [item for item in self.scene().items() if isinstance(item, QtNode)]
-
-        for node in nodes:
-            node.calculate_forces()
+        if self._layout_step_pending:
+            return  # Worker is still busy with the last step, don't queue up more
+        if self.scene().mouseGrabberItem() is not None:
+            # Don't lay out the graph while the user is dragging part of it, that keeps dragging
+            # smooth however large the graph is. The layout picks up again after the drop
+            return
+        self._alpha -= self._alpha * self._alpha_decay
+        if self._alpha < self._alpha_min:
+            log.debug('Layout cooled down')
+            self.stop_layout_timer()
+            return
+        positions = self._pos
+        if self._pos_needs_sync:
+            # Nodes have no parent, so their pos() is already in scene coordinates
+            positions.reshape(-1)[:] = np.fromiter(
+                (coord for node in self._nodes for coord in node.pos().toTuple()),
+                dtype=POSITION_DTYPE,
+                count=positions.size,
+            )
+            self._item_pos[:] = positions
+            self._pos_needs_sync = False
+        self._layout_step_pending = True
+        # The worker gets a copy, so it never sees the array change underneath it
+        self.step_requested.emit(self._layout_generation, positions.copy(), self._alpha)
+
+    @Slot(int, object, float)
+    def apply_layout_step(self, generation: int, new_positions: Optional[np.ndarray], displacement_squared: float):
+        """
+        Move the nodes to the positions calculated by the physics worker
+        :param generation: Layout generation the positions were calculated for
+        :param new_positions: (N, 2) array of the new node positions, or None if the worker skipped the step
+        :param displacement_squared: Largest squared distance any node moved in the step
+        """
+        # Every request gets exactly one result, so the worker is free for the next step
+        # from here on, even if this one turns out to be stale
+        self._layout_step_pending = False
+        if generation != self._layout_generation:
+            # Calculated from positions that were replaced since (a new graph, or randomized nodes).
+            # Dropped without touching _pos or the items, so it can't undo the replacement
+            log.debug(f'Dropping stale layout step from generation {generation}')
+            return
+        if new_positions is None:
+            # The worker skipped a step it didn't have the graph for, don't mistake it for a settled layout
+            log.debug('Dropping skipped layout step')
+            return
 
-        items_moved = False
-        for node in nodes:
-            if node.advance():
-                items_moved = True
+        # Stop once the layout has visually settled, instead of chasing sub-pixel jitter forever
+        if displacement_squared < SETTLED_DISPLACEMENT**2:
+            self.stop_layout_timer()
+            return
 
-        if not items_moved:
+        # Don't fight the user for the node they're dragging
+        mouse_grabber = self.scene().mouseGrabberItem()
+        if isinstance(mouse_grabber, QtNode):
+            new_positions[mouse_grabber.index] = mouse_grabber.pos().toTuple()
+
+        # Only move the items that are now far enough from where they're drawn to be worth it,
+        # without calling into every node to find out
+        offsets = new_positions - self._item_pos
+        moved_indices = np.flatnonzero(np.einsum('ij,ij->i', offsets, offsets) >= self._MIN_MOVE_SQUARED)
+        nodes = self._nodes
+        edges = self._edges
+        with self.batched_node_moves():
+            for node_index, (new_x, new_y) in zip(moved_indices.tolist(), new_positions[moved_indices].tolist()):
+                nodes[node_index].setPos(new_x, new_y)
+            # Every edge with a moved node at either end, found in one go instead of node by node
+            node_moved = np.zeros(len(nodes), dtype=bool)
+            node_moved[moved_indices] = True
+            moved_edge_indices = np.flatnonzero(node_moved[self._edge_index].any(axis=1))
+            self.mark_edges_dirty([edges[edge_idx] for edge_idx in moved_edge_indices.tolist()])
+        self._item_pos[moved_indices] = new_positions[moved_indices]
+
+        # The new positions are the layout's state from now on, even for nodes that only
+        # moved too little to bother moving their item
+        self._pos = new_positions
+
+        if len(moved_indices) == 0:
             # Stop running update calculations if nothing is moving
+            self.stop_layout_timer()
+
+    def stop_layout_timer(self):
+        """
+        Stop the timer driving the layout, until an item is moved again
+        """
+        if self._timer_id:
             self.killTimer(self._timer_id)
             self._timer_id = 0
+            # The layout is static now, so index the items to make painting and picking O(visible),
+            # and redraw everything antialiased again
+            self.scene().setItemIndexMethod(QGraphicsScene.BspTreeIndex)
+            if not self._opengl_viewport:
+                self.setRenderHint(QPainter.Antialiasing, self._view_antialiasing)
+            self.viewport().update()
+
+    def stop_physics_thread(self):
+        """
+        Stop the physics worker thread, waiting for any in progress step to finish
+        """
+        self._physics_thread.quit()
+        self._physics_thread.wait()
 
     def wheelEvent(self, event):
         """
@@ -754,6 +1331,9 @@ class GraphWidget(QGraphicsView):
 
 
 class MainWidget(QWidget):
+    # Step delays from which the simulation timer only needs to be accurate to the second
+    _VERY_COARSE_TIMER_MIN_DELAY_MS = 2000
+
     def __init__(self):
         """
         Main widget in the window
@@ -782,10 +1362,30 @@ class MainWidget(QWidget):
         param_tree = ParameterTree()
         param_tree.setParameters(self.param_root, showTop=False)
 
+        # Debug text setting waiting to be applied, None if there's no change waiting
+        self._pending_show_debug: Optional[bool] = None
+        # Handler of each parameter's changes. Looked up by identity, since comparing
+        # Parameters with == goes through Qt for each of them
+        self._param_handlers: Dict[int, Callable[[str, Any], None]] = {
+            id(self.param_one_step): self.one_step_change,
+            id(self.param_run_cont): self.run_cont_change,
+            id(self.param_update_delay): self.update_delay_change,
+            id(self.param_sim_step_idx): lambda change, data: None,  # Only updated internally
+            id(self.param_show_dbg_txt): self.show_dbg_txt_change,
+        }
         self.param_root.sigTreeStateChanged.connect(self.param_change)
 
         self.simulation_timer = QTimer(self)
-        self.simulation_timer.timeout.connect(self.step_simulation)
+        # The simulation steps at most ten times a second, so it doesn't need (and shouldn't keep the OS at)
+        # the millisecond timer resolution of a precise timer
+        self.simulation_timer.setTimerType(Qt.CoarseTimer)
+        # Each step schedules the next one from a fixed deadline, so the time spent stepping (and the
+        # timer's own inaccuracy) doesn't add up into the simulation falling behind its delay
+        self.simulation_timer.setSingleShot(True)
+        self.simulation_timer.timeout.connect(self.continuous_step_simulation)
+        self._simulation_delay_ms: Optional[int] = None
+        # When the next continuous step is due, by time.monotonic_ns(). None if not running continuously
+        self._next_step_deadline_ns: Optional[int] = None
 
         self.h_layout = QHBoxLayout(self)
         self.h_layout.addWidget(param_tree, 1)
@@ -799,27 +1399,111 @@ class MainWidget(QWidget):
         """
         log.debug(f'Parameter changes:{changes}')
         for param, change, data in changes:
-            if param == self.param_one_step and change == 'activated':
-                self.step_simulation()
-            elif param == self.param_one_step and change == 'options':
-                self.param_one_step.setOpts(**data)
-            elif param == self.param_run_cont:
-                if data is True:
-                    self.simulation_timer.setInterval(self.param_update_delay.value())
-                    self.simulation_timer.start()
-                else:
-                    self.simulation_timer.stop()
-            elif param == self.param_update_delay:
-                self.simulation_timer.setInterval(self.param_update_delay.value())
-            elif param == self.param_sim_step_idx:
-                pass  # Only updated internally
-            elif param == self.param_show_dbg_txt:
-                for item in self.graph_widget.scene().items():
-                    if hasattr(item, 'show_debug'):
-                        item.show_debug = True if data is True else False
-            else:
+            param_handler = self._param_handlers.get(id(param))
+            if param_handler is None:
                 log.error(f'Unknown parameter change:{param}')
+            else:
+                param_handler(change, data)
 
+    def one_step_change(self, change: str, data: Any):
+        """
+        Callback for when the one step parameter has changed
+        :param change: Type of parameter change
+        :param data: Data of the parameter change
+        """
+        if change == 'activated':
+            self.step_simulation()
+        elif change == 'options':
+            self.param_one_step.setOpts(**data)
+        else:
+            log.error(f'Unknown parameter change:{self.param_one_step}')
+
+    def run_cont_change(self, change: str, data: Any):
+        """
+        Callback for when the run continuous parameter has changed
+        :param change: Type of parameter change
+        :param data: Data of the parameter change
+        """
+        if data is True:
+            self.set_simulation_delay(self.param_update_delay.value())
+            self.start_simulation_timer()
+        else:
+            self.stop_simulation_timer()
+
+    def update_delay_change(self, change: str, data: Any):
+        """
+        Callback for when the update delay parameter has changed
+        :param change: Type of parameter change
+        :param data: Data of the parameter change
+        """
+        self.set_simulation_delay(self.param_update_delay.value())
+
+    def show_dbg_txt_change(self, change: str, data: Any):
+        """
+        Callback for when the show debug text parameter has changed
+        :param change: Type of parameter change
+        :param data: Data of the parameter change
+        """
+        # Showing the debug text goes through every item, so only apply the last of a burst of changes
+        if self._pending_show_debug is None:
+            QTimer.singleShot(0, self.apply_show_debug)
+        self._pending_show_debug = data is True
+
+    @Slot()
+    def apply_show_debug(self):
+        """
+        Show or hide the debug text in the graph, as it was last set in the parameter tree
+        """
+        show_debug = self._pending_show_debug
+        self._pending_show_debug = None
+        if show_debug is not None:
+            self.graph_widget.set_show_debug(show_debug)
+
+    def set_simulation_delay(self, delay_ms: int):
+        """
+        Set the delay between continuous simulation steps, with the coarsest timer that's accurate enough for it
+        :param delay_ms: Delay between simulation steps in milliseconds
+        """
+        if delay_ms == self._simulation_delay_ms:
+            return  # Don't restart the timer (and lose the time towards the next step) if nothing changed
+        self._simulation_delay_ms = delay_ms
+        timer_type = Qt.VeryCoarseTimer if delay_ms >= self._VERY_COARSE_TIMER_MIN_DELAY_MS else Qt.CoarseTimer
+        self.simulation_timer.setTimerType(timer_type)
+        if self._next_step_deadline_ns is not None:
+            # Restart the running timer, which is also what applies the new timer type
+            self.start_simulation_timer()
+
+    def start_simulation_timer(self):
+        """
+        (Re)start stepping the simulation continuously, with the first step one delay from now
+        """
+        self._next_step_deadline_ns = time.monotonic_ns() + self._simulation_delay_ms * 1_000_000
+        self.simulation_timer.start(self._simulation_delay_ms)
+
+    def stop_simulation_timer(self):
+        """
+        Stop stepping the simulation continuously
+        """
+        self.simulation_timer.stop()
+        self._next_step_deadline_ns = None
+
+    @Slot()
+    def continuous_step_simulation(self):
+        """
+        Advance the simulation one time step, and schedule the next step for one delay after this one was due
+        """
+        self.step_simulation()
+        if self._next_step_deadline_ns is None:
+            return  # The simulation finished, which stopped running it continuously
+        delay_ns = self._simulation_delay_ms * 1_000_000
+        now_ns = time.monotonic_ns()
+        self._next_step_deadline_ns += delay_ns
+        if self._next_step_deadline_ns < now_ns:
+            # More than a whole step behind, count from now instead of rushing through steps to catch up
+            self._next_step_deadline_ns = now_ns + delay_ns
+        self.simulation_timer.start((self._next_step_deadline_ns - now_ns) // 1_000_000)
+
+    @Slot()
     def step_simulation(self):
         """
         Advance the simulation one time step
@@ -830,9 +1514,12 @@ class MainWidget(QWidget):
         sim_finished, sim_step_idx = self.graph_widget.advance_simulation()
         self.param_sim_step_idx.setValue(sim_step_idx)
         if sim_finished:
-            self.param_one_step.setOpts(enabled=False)
-            self.param_run_cont.setValue(False)
-            self.param_run_cont.setOpts(enabled=False)
+            # Stop straight away, instead of it being up to the parameter change to stop the timer
+            self.stop_simulation_timer()
+            with self.param_root.treeChangeBlocker():
+                self.param_one_step.setOpts(enabled=False)
+                self.param_run_cont.setValue(False)
+                self.param_run_cont.setOpts(enabled=False)
 
     def set_simulation(self, simulation: Simulation):
         """
@@ -840,9 +1527,13 @@ class MainWidget(QWidget):
         :param simulation: The new simulation graph
         """
         self.graph_widget.set_simulation(simulation)
-        for child_param in self.param_root.children():
-            child_param.setValue(child_param.defaultValue())
-            child_param.setOpts(enabled=True)
+        # Collect all the resets into a single tree change, instead of handling each one as it's made
+        with self.param_root.treeChangeBlocker():
+            for child_param in self.param_root.children():
+                # Parameters still at their default don't need to be reset (and handled) again
+                if child_param.value() != child_param.defaultValue():
+                    child_param.setValue(child_param.defaultValue())
+                child_param.setOpts(enabled=True)
 
 
 class MainWindow(QMainWindow):
@@ -877,9 +1568,23 @@ class MainWindow(QMainWindow):
         self.exit_action.triggered.connect(exit_handler)
         self.file_menu.addAction(self.exit_action)
 
-        log.debug('Creating MainWidget')
-        self.main_widget = MainWidget()
-        self.setCentralWidget(self.main_widget)
+        # The main widget (and the parameter tree and graph in it) is only created once there's a simulation
+        # to show, so the window can show up without waiting for them
+        self.main_widget: Optional[MainWidget] = None
+        no_sim_label = QLabel('No simulation loaded')
+        no_sim_label.setAlignment(Qt.AlignCenter)
+        self.setCentralWidget(no_sim_label)
+
+    def ensure_main_widget(self) -> 'MainWidget':
+        """
+        Create the main widget, if it hasn't been created yet
+        :return: The main widget
+        """
+        if self.main_widget is None:
+            log.debug('Creating MainWidget')
+            self.main_widget = MainWidget()
+            self.setCentralWidget(self.main_widget)
+        return self.main_widget
 
     def set_window_title(self):
         """
@@ -888,6 +1593,7 @@ class MainWindow(QMainWindow):
         file_path_str = str(self.loaded_file_path) if self.loaded_file_path else 'No file loaded'
         self.setWindowTitle(f'{self.bare_window_title} - {file_path_str}')
 
+    @Slot()
     def load_file(self, file_path: Optional[Path] = None):
         """
         Load a simulation into the graph widget
@@ -909,20 +1615,22 @@ class MainWindow(QMainWindow):
             log.error(f'Could not load {resolved_file_path}: {e}')
             return
         self.loaded_file_path = resolved_file_path
-        self.main_widget.set_simulation(new_sim)
+        self.ensure_main_widget().set_simulation(new_sim)
         self.set_window_title()
 
+    @Slot()
     def save_file(self):
         """
         Save the current graph to the same file
         """
         self.save_file_as(self.loaded_file_path)
 
+    @Slot()
     def save_file_as(self, file_path: Optional[Path] = None):
         """
         Save the current graph to a potentially differently named file
         """
-        if not self.main_widget.graph_widget.simulation:
+        if self.main_widget is None or not self.main_widget.graph_widget.simulation:
             log.warning(f'Cannot save with no simulation loaded')
             return
 
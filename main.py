@@ -6,6 +6,7 @@ import colorama
 import sys
 from pathlib import Path
 
+import graphics_visualization
 from graphics_visualization import MainApp
 
 log = logging.getLogger('main')
@@ -22,6 +23,11 @@ parser.add_argument(
     default='WARNING',
     help='Set the logging level, one of %(choices)s (default %(default)s)',
 )
+parser.add_argument(
+    '--no_opengl',
+    action='store_true',
+    help='Render with the software rasterizer instead of OpenGL',
+)
 parser.add_argument(
     'file_to_load',
     metavar='FILE',
@@ -63,6 +69,7 @@ def main():
     """
     Main script function
     """
+    graphics_visualization.USE_OPENGL_VIEWPORT = not args.no_opengl
     log.debug('Creating MainApp')
     main_app = MainApp('Train Simulation')
     main_app.main_window.load_file(args.file_to_load)
@@ -96,6 +96,8 @@ class Junction(SimObject):
         :param junct2: Second switch connecting Junction
         """
         new_switch_state = (junct1, junct2)
+        if new_switch_state == self.switch_state:
+            return  # Routes mostly set switches to where they already are, nothing to check or log
         log.info(f'Switching {self} from {self.switch_state} to {new_switch_state}')
         if junct1 not in self.connected_junctions:
             raise IndexError(f'Can\'t set switch state: {junct1} not in {self.connected_junctions}')